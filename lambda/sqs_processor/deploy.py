@@ -1,3 +1,6 @@
+import base64
+import hashlib
+import json
 import logging
 import os
 import shutil
@@ -8,6 +11,7 @@ from pathlib import Path
 from urllib.parse import urlparse
 
 import boto3
+from botocore.config import Config
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -20,83 +24,259 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY", "test")
 OPENSEARCH_URL = os.getenv("OPENSEARCH_URL", "http://opensearch:9200")
 FUNCTION_NAME = os.getenv("LAMBDA_FUNCTION_NAME", "sqs_processor")
 INDEX_NAME = os.getenv("INDEX_NAME", "audit-logs")
+SQS_MAX_RECEIVE_COUNT = int(os.getenv("SQS_MAX_RECEIVE_COUNT", "5"))
+# Maximum concurrent invocations by the SQS pollers, bounds the load on OpenSearch (2 to 1000)
+SQS_MAX_CONCURRENCY = int(os.getenv("SQS_MAX_CONCURRENCY", "10"))
+# Messages per invocation, gathered for up to the batching window, each invocation indexes them in one _bulk request
+SQS_BATCH_SIZE = int(os.getenv("SQS_BATCH_SIZE", "100"))
+# Seconds to wait for a full batch, required to be at least 1 when the batch size is above 10
+SQS_BATCHING_WINDOW = int(os.getenv("SQS_BATCHING_WINDOW", "1"))
+LAYER_NAME = os.getenv("LAMBDA_LAYER_NAME", "sqs-processor-deps")
+# Ship the dependencies as a layer, LocalStack community accepts layers but doesn't mount them into the functions, so
+# by default they are bundled in the function zip
+USE_LAMBDA_LAYER = os.getenv("USE_LAMBDA_LAYER", "false").lower() == "true"
+RUNTIME = "python3.9"
+DEPLOY_CACHE_DIR = Path(".deploy_cache")
+DEFAULT_REQUIREMENTS = b"boto3\nopensearch-py\norjson\n"
+BINARY_SUFFIXES = {".so", ".pyd", ".dylib"}
+PRUNED_DIR_NAMES = {"__pycache__", "tests", "test"}
+PRUNED_FILE_SUFFIXES = {".pyc", ".pyo"}
+WAITER_CONFIG = {"Delay": 1, "MaxAttempts": 30}
 
 aws_config = {
     "endpoint_url": SQS_ENDPOINT_URL,
     "region_name": AWS_REGION,
     "aws_access_key_id": AWS_ACCESS_KEY_ID,
     "aws_secret_access_key": "test",
+    # Every call retries throttling errors with client-side rate limiting and jittered exponential backoff
+    "config": Config(retries={"mode": "adaptive", "max_attempts": 10}),
 }
 
 
-def create_zip():
-    """Create a zip file containing the Lambda function code."""
+def requirements_digest() -> str:
+    """Get the SHA256 digest of the Lambda requirements."""
+    requirements_path = Path("requirements.txt")
+    requirements = requirements_path.read_bytes() if requirements_path.exists() else DEFAULT_REQUIREMENTS
+    return hashlib.sha256(requirements).hexdigest()
+
+
+def prune_dependencies(deps_dir: Path) -> None:
+    """Remove the files of the installed dependencies which are not needed at runtime."""
+    for path in list(deps_dir.rglob("*")):
+        if not path.exists():
+            # Already removed along with its parent directory
+            continue
+        if path.is_dir() and (path.name in PRUNED_DIR_NAMES or path.suffix == ".dist-info"):
+            shutil.rmtree(path)
+        elif path.is_file() and path.suffix in PRUNED_FILE_SUFFIXES:
+            path.unlink()
+
+
+def install_dependencies(digest: str) -> Path:
+    """
+    Install the Lambda dependencies into a cache directory keyed by the requirements hash.
+
+    Args:
+        digest (str): Digest of the requirements, see `requirements_digest`
+
+    Returns:
+        Path: Directory containing the installed dependencies
+    """
+    deps_dir = DEPLOY_CACHE_DIR / f"deps-{digest}"
+    if deps_dir.exists():
+        logger.info(f"Requirements unchanged, reusing cached dependencies: {deps_dir}")
+        return deps_dir
+
+    requirements_path = Path("requirements.txt")
+    if requirements_path.exists():
+        install_args = ["-r", str(requirements_path)]
+    else:
+        # Install required packages if no requirements.txt
+        install_args = DEFAULT_REQUIREMENTS.decode().split()
+
+    # Install into a temporary directory first so an interrupted install is never reused
+    tmp_dir = DEPLOY_CACHE_DIR / f"tmp-{digest}"
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    if shutil.which("uv"):
+        # uv resolves much faster than pip, force wheels matching the Lambda runtime rather than the local machine
+        command = [
+            "uv",
+            "pip",
+            "install",
+            *install_args,
+            "--target",
+            str(tmp_dir),
+            "--python-platform",
+            "x86_64-manylinux2014",
+            "--python-version",
+            RUNTIME.removeprefix("python"),
+        ]
+    else:
+        # Same target as uv, native wheels like orjson must match the Lambda runtime rather than the local Python.
+        # Skip .pyc generation, Lambda compiles the modules on import anyway
+        command = [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            *install_args,
+            "--no-compile",
+            "--target",
+            str(tmp_dir),
+            "--platform",
+            "manylinux2014_x86_64",
+            "--implementation",
+            "cp",
+            "--python-version",
+            RUNTIME.removeprefix("python"),
+            "--only-binary=:all:",
+        ]
+    subprocess.run(command, check=True)
+    prune_dependencies(tmp_dir)
+    tmp_dir.rename(deps_dir)
+    logger.info(f"Installed dependencies into cache: {deps_dir}")
+    return deps_dir
+
+
+def iter_files(directory: Path):
+    """Recursively yield the files of a directory."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_files(Path(entry.path))
+            elif entry.is_file():
+                yield Path(entry.path)
+
+
+def write_zip(zip_path: Path, source_dir: Path, prefix: str = "") -> None:
+    """Zip the content of a directory, placing every entry under the given prefix."""
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+        for file_path in iter_files(source_dir):
+            arcname = str(Path(prefix) / file_path.relative_to(source_dir))
+            # Native binaries barely compress, storing them saves most of the zipping time
+            compress_type = zipfile.ZIP_STORED if file_path.suffix in BINARY_SUFFIXES else zipfile.ZIP_DEFLATED
+            zipf.write(file_path, arcname, compress_type=compress_type)
+
+
+def build_layer_zip(digest: str) -> Path:
+    """
+    Create a Lambda Layer zip file containing the dependencies.
+
+    The zip is cached next to the installed dependencies, so it is only built when the requirements change.
+
+    Args:
+        digest (str): Digest of the requirements, see `requirements_digest`
+
+    Returns:
+        Path: Path of the layer zip file
+    """
+    try:
+        zip_path = DEPLOY_CACHE_DIR / f"layer-{digest}.zip"
+        if zip_path.exists():
+            return zip_path
+
+        # Lambda adds the `python` directory of each layer to the module search path
+        deps_dir = install_dependencies(digest)
+        tmp_path = zip_path.with_suffix(".tmp")
+        write_zip(tmp_path, deps_dir, prefix="python")
+        tmp_path.rename(zip_path)
+
+        logger.info(f"Created layer zip file: {zip_path}")
+        return zip_path
+
+    except Exception as e:
+        logger.error(f"Error creating layer zip file: {str(e)}")
+        raise
+
+
+def build_code_zip() -> Path:
+    """
+    Create a zip file containing the Lambda function code, along with its dependencies unless they ship as a layer.
+
+    Returns:
+        Path: Path of the code zip file
+    """
     try:
         # Create build directory
         build_dir = Path("build")
         if build_dir.exists():
             shutil.rmtree(build_dir)
-        build_dir.mkdir(parents=True)
-
-        # Install dependencies directly to the build directory
-        requirements_path = Path("requirements.txt")
-        if requirements_path.exists():
-            subprocess.run(
-                [sys.executable, "-m", "pip", "install", "-r", str(requirements_path), "--target", str(build_dir)],
-                check=True,
-            )
-        else:
-            # Install required packages if no requirements.txt
-            subprocess.run(
-                [sys.executable, "-m", "pip", "install", "boto3", "opensearch-py", "--target", str(build_dir)],
-                check=True,
-            )
+        code_dir = build_dir / "code"
+        code_dir.mkdir(parents=True)
+        if not USE_LAMBDA_LAYER:
+            shutil.copytree(install_dependencies(requirements_digest()), code_dir, dirs_exist_ok=True)
 
-        # Copy handler.py to the root of the build directory
+        # Copy handler.py to the root of the code directory
         handler_path = Path("handler.py")
         if handler_path.exists():
-            shutil.copy2(handler_path, build_dir / handler_path.name)
+            shutil.copy2(handler_path, code_dir / handler_path.name)
 
         # Create the zip file
         zip_path = build_dir / f"{FUNCTION_NAME}.zip"
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(build_dir):
-                for file in files:
-                    file_path = Path(root) / file
-                    arcname = str(file_path.relative_to(build_dir))
-                    zipf.write(file_path, arcname)
+        write_zip(zip_path, code_dir)
 
         logger.info(f"Created zip file: {zip_path}")
-        return str(zip_path)
+        return zip_path
 
     except Exception as e:
         logger.error(f"Error creating zip file: {str(e)}")
         raise
 
 
-def wait_for_lambda_active(lambda_client, function_name: str):
-    """Wait for the Lambda function to be active."""
-    import time
+def publish_layer(lambda_client, digest: str) -> str:
+    """
+    Publish the dependencies layer unless a version for the same requirements already exists.
 
-    max_attempts = 10
-    for _ in range(max_attempts):
-        try:
-            response = lambda_client.get_function_configuration(FunctionName=function_name)
-            if response["State"] == "Active":
-                logger.info("Lambda function is now active")
-                return True
-            logger.info("Waiting for Lambda function to be active...")
-            time.sleep(2)
-        except Exception as e:
-            logger.warning(f"Waiting for Lambda function: {str(e)}")
-            time.sleep(2)
-    raise Exception("Timed out waiting for Lambda function to become active")
-
-
-def deploy_lambda(zip_path: str):
+    Args:
+        lambda_client: Boto3 Lambda client
+        digest (str): Digest of the requirements, see `requirements_digest`
+
+    Returns:
+        str: ARN of the layer version to attach to the function
+    """
+    try:
+        # The requirements digest is stored as the layer version description
+        versions = lambda_client.list_layer_versions(LayerName=LAYER_NAME).get("LayerVersions", [])
+        for version in versions:
+            if version.get("Description") == digest:
+                logger.info(f"Dependencies unchanged, reusing layer: {version['LayerVersionArn']}")
+                return version["LayerVersionArn"]
+
+        with open(build_layer_zip(digest), "rb") as f:
+            layer_bytes = f.read()
+
+        response = lambda_client.publish_layer_version(
+            LayerName=LAYER_NAME,
+            Description=digest,
+            Content={"ZipFile": layer_bytes},
+            CompatibleRuntimes=[RUNTIME],
+        )
+        logger.info(f"Published layer: {response['LayerVersionArn']}")
+        return response["LayerVersionArn"]
+
+    except Exception as e:
+        logger.error(f"Error publishing layer: {str(e)}")
+        raise
+
+
+def wait_for_lambda_updated(lambda_client):
+    """Wait for the last update of the Lambda function to finish."""
+    lambda_client.get_waiter("function_updated_v2").wait(FunctionName=FUNCTION_NAME, WaiterConfig=WAITER_CONFIG)
+
+
+def is_config_changed(current: dict, function_config: dict, layers: list) -> bool:
+    """Check whether the deployed function configuration differs from the desired one."""
+    if [layer["Arn"] for layer in current.get("Layers", [])] != layers:
+        return True
+    return any(current.get(key) != value for key, value in function_config.items())
+
+
+def deploy_lambda(zip_path: Path):
     """Deploy the Lambda function to LocalStack."""
     try:
         lambda_client = boto3.client("lambda", **aws_config)
+        layers = [publish_layer(lambda_client, requirements_digest())] if USE_LAMBDA_LAYER else []
 
         role_arn = "arn:aws:iam::000000000000:role/lambda-role"  # Placeholder role for LocalStack
 
@@ -117,37 +297,50 @@ def deploy_lambda(zip_path: str):
             }
         }
 
+        function_config = {
+            "Runtime": RUNTIME,
+            "Role": role_arn,
+            "Handler": "handler.lambda_handler",
+            "Timeout": 30,
+            "MemorySize": 256,
+            "Environment": environment,
+        }
+
         try:
             # Try to update the function if it exists
-            response = lambda_client.update_function_code(FunctionName=FUNCTION_NAME, ZipFile=zip_bytes)
-            # Update configuration
-            lambda_client.update_function_configuration(
-                FunctionName=FUNCTION_NAME,
-                Runtime="python3.9",
-                Role=role_arn,
-                Handler="handler.lambda_handler",
-                Timeout=30,
-                MemorySize=256,
-                Environment=environment,
-            )
-            logger.info(f"Updated Lambda function: {response['FunctionArn']}")
+            current = lambda_client.get_function_configuration(FunctionName=FUNCTION_NAME)
+
+            # Lambda reports the base64 encoded SHA256 of the deployed package, skip the upload if it matches
+            code_sha = base64.b64encode(hashlib.sha256(zip_bytes).digest()).decode()
+            if current["CodeSha256"] == code_sha:
+                logger.info("Lambda function code unchanged, skipping code update")
+            else:
+                lambda_client.update_function_code(FunctionName=FUNCTION_NAME, ZipFile=zip_bytes)
+                # Configuration can't be updated while the code update is still in progress
+                wait_for_lambda_updated(lambda_client)
+
+            if is_config_changed(current, function_config, layers):
+                lambda_client.update_function_configuration(
+                    FunctionName=FUNCTION_NAME, Layers=layers, **function_config
+                )
+                wait_for_lambda_updated(lambda_client)
+            else:
+                logger.info("Lambda function configuration unchanged, skipping configuration update")
+            logger.info(f"Updated Lambda function: {current['FunctionArn']}")
         except lambda_client.exceptions.ResourceNotFoundException:
             # Create the function if it doesn't exist
             response = lambda_client.create_function(
                 FunctionName=FUNCTION_NAME,
-                Runtime="python3.9",
-                Role=role_arn,
-                Handler="handler.lambda_handler",
                 Code={"ZipFile": zip_bytes},
-                Timeout=30,
-                MemorySize=256,
-                Environment=environment,
+                Layers=layers,
                 Publish=True,
+                **function_config,
             )
             logger.info(f"Created Lambda function: {response['FunctionArn']}")
 
             # Wait for the function to be active
-            wait_for_lambda_active(lambda_client, FUNCTION_NAME)
+            lambda_client.get_waiter("function_active_v2").wait(FunctionName=FUNCTION_NAME, WaiterConfig=WAITER_CONFIG)
+            logger.info("Lambda function is now active")
         except lambda_client.exceptions.ResourceConflictException:
             logger.info("Event source mapping already exists")
             return lambda_client
@@ -158,8 +351,27 @@ def deploy_lambda(zip_path: str):
         raise
 
 
+def ensure_dead_letter_queue_exists(sqs, queue_name: str) -> str:
+    """
+    Ensure the dead-letter queue of the given queue exists, create it if it doesn't.
+
+    Returns:
+        str: ARN of the dead-letter queue
+    """
+    # CreateQueue is idempotent as long as the attributes don't change
+    dlq_name = f"{queue_name}-dlq"
+    response = sqs.create_queue(QueueName=dlq_name, Attributes={"MessageRetentionPeriod": "1209600"})  # 14 days
+    attributes = sqs.get_queue_attributes(QueueUrl=response["QueueUrl"], AttributeNames=["QueueArn"])
+    logger.info(f"SQS dead-letter queue {dlq_name} is ready")
+    return attributes["Attributes"]["QueueArn"]
+
+
 def ensure_sqs_queue_exists():
-    """Ensure SQS queue exists, create it if it doesn't."""
+    """
+    Ensure SQS queue exists, create it if it doesn't.
+
+    Failed messages are retried by SQS itself and moved to the dead-letter queue after `SQS_MAX_RECEIVE_COUNT` receives.
+    """
     try:
         sqs = boto3.client("sqs", **aws_config)
 
@@ -167,15 +379,27 @@ def ensure_sqs_queue_exists():
         parsed_url = urlparse(SQS_QUEUE_URL)
         queue_name = parsed_url.path.split("/")[-1]
 
+        redrive_policy = json.dumps(
+            {
+                "deadLetterTargetArn": ensure_dead_letter_queue_exists(sqs, queue_name),
+                "maxReceiveCount": SQS_MAX_RECEIVE_COUNT,
+            }
+        )
+
         try:
             # Try to get the queue URL to check if it exists
-            sqs.get_queue_url(QueueName=queue_name)
+            queue_url = sqs.get_queue_url(QueueName=queue_name)["QueueUrl"]
+            sqs.set_queue_attributes(QueueUrl=queue_url, Attributes={"RedrivePolicy": redrive_policy})
             logger.info(f"SQS queue {queue_name} already exists")
             return sqs
         except sqs.exceptions.QueueDoesNotExist:
             # Create the queue if it doesn't exist
             logger.info(f"Creating SQS queue: {queue_name}")
-            attributes = {"VisibilityTimeout": "300", "MessageRetentionPeriod": "1209600"}  # 5 minutes  # 14 days
+            attributes = {
+                "VisibilityTimeout": "300",  # 5 minutes
+                "MessageRetentionPeriod": "1209600",  # 14 days
+                "RedrivePolicy": redrive_policy,
+            }
             response = sqs.create_queue(QueueName=queue_name, Attributes=attributes)
             logger.info(f"Created SQS queue: {response['QueueUrl']}")
 
@@ -204,9 +428,10 @@ def create_event_source_mapping(lambda_client):
                 EventSourceArn=queue_arn,
                 FunctionName=FUNCTION_NAME,  # Must match the deployed Lambda function name
                 Enabled=True,
-                BatchSize=10,
-                MaximumBatchingWindowInSeconds=0,  # Process messages as soon as they're available
+                BatchSize=SQS_BATCH_SIZE,
+                MaximumBatchingWindowInSeconds=SQS_BATCHING_WINDOW,
                 FunctionResponseTypes=["ReportBatchItemFailures"],  # Enable reporting batch item failures
+                ScalingConfig={"MaximumConcurrency": SQS_MAX_CONCURRENCY},
             )
             logger.info(f"Created event source mapping: {response['UUID']}")
             return response
@@ -224,6 +449,20 @@ def create_event_source_mapping(lambda_client):
             raise
         except lambda_client.exceptions.ResourceConflictException as e:
             logger.info(f"Event source mapping already exists: {str(e)}")
+            mappings = lambda_client.list_event_source_mappings(FunctionName=FUNCTION_NAME, EventSourceArn=queue_arn)
+            for mapping in mappings.get("EventSourceMappings", []):
+                if (
+                    mapping.get("ScalingConfig", {}).get("MaximumConcurrency") != SQS_MAX_CONCURRENCY
+                    or mapping.get("BatchSize") != SQS_BATCH_SIZE
+                    or mapping.get("MaximumBatchingWindowInSeconds") != SQS_BATCHING_WINDOW
+                ):
+                    lambda_client.update_event_source_mapping(
+                        UUID=mapping["UUID"],
+                        BatchSize=SQS_BATCH_SIZE,
+                        MaximumBatchingWindowInSeconds=SQS_BATCHING_WINDOW,
+                        ScalingConfig={"MaximumConcurrency": SQS_MAX_CONCURRENCY},
+                    )
+                    logger.info(f"Updated batching and concurrency of event source mapping: {mapping['UUID']}")
 
     except Exception as e:
         logger.error(f"Error creating event source mapping: {str(e)}")
@@ -236,8 +475,8 @@ def main():
         # First ensure SQS queue exists
         ensure_sqs_queue_exists()
 
-        # Create the deployment package
-        zip_path = create_zip()
+        # Create the deployment package, dependencies are bundled unless they ship as a layer
+        zip_path = build_code_zip()
 
         # Deploy the Lambda function
         lambda_client = deploy_lambda(zip_path)
@@ -1,81 +1,131 @@
-import json
 import logging
 import os
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import boto3
-import opensearchpy
-from opensearchpy import OpenSearch
+import orjson
+from opensearchpy import JSONSerializer, OpenSearch, helpers
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-# Initialize clients
-sqs = boto3.client("sqs")
 
 TASK_INDEX_LOG = os.getenv("TASK_INDEX_LOG", "INDEX_LOG")
 INDEX_NAME = os.getenv("INDEX_NAME", "audit-logs")
+SQS_QUEUE_URL = os.getenv("SQS_QUEUE_URL", "")
+# Failed messages become visible again after 30s, 60s, 120s... capped at the SQS maximum of 12 hours
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 43200
+# Maximum number of entries of a ChangeMessageVisibilityBatch call
+SQS_BATCH_MAX_ENTRIES = 10
+# Documents per _bulk request, above the batch size of the event source mapping so that a batch is a single request
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+# Payload fields copied as is into the indexed document
+INDEX_FIELDS = ("id", "tenant_id", "message", "created_at", "user_id", "action", "resource_type", "severity")
+
+
+class OrjsonSerializer(JSONSerializer):
+    """OpenSearch serializer encoding request bodies with orjson."""
+
+    def dumps(self, data: Any) -> str:
+        if isinstance(data, str):
+            return data
+        return orjson.dumps(data, default=self.default).decode()
+
+
+# Initialize clients once per execution environment so warm invocations reuse the connections
+opensearch_client = OpenSearch(
+    hosts=[os.getenv("OPENSEARCH_URL", "http://opensearch_con:9200")],
+    timeout=30,
+    http_compress=True,
+    pool_maxsize=10,
+    retry_on_timeout=True,
+    max_retries=3,
+    serializer=OrjsonSerializer(),
+)
+sqs_client = boto3.client("sqs")
+# Whether the index is known to exist in this execution environment
+index_ready = False
+
+
+def process_message(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Process a single SQS message.
 
+    Returns:
+        Optional[Dict[str, Any]]: Bulk action to send to OpenSearch, None if there is nothing to index
+    """
+    body = orjson.loads(message["body"])
+    task_type = body.get("task_type")
 
-def get_queue_url(queue_name: str) -> str:
-    """Get the URL of the SQS queue."""
-    try:
-        response = sqs.get_queue_url(QueueName=queue_name)
-        return response["QueueUrl"]
-    except Exception as e:
-        logger.error(f"Error getting queue URL: {str(e)}")
-        raise
+    if task_type == TASK_INDEX_LOG:
+        return process_index_log(body)
 
+    logger.warning(f"Unknown task type: {task_type}")
+    return None
 
-def process_message(opensearch: OpenSearch, message: Dict[str, Any]) -> None:
-    """Process a single SQS message."""
-    try:
-        body = json.loads(message["body"])
-        task_type = body.get("task_type")
 
-        if task_type == TASK_INDEX_LOG:
-            process_index_log(opensearch, body)
-        else:
-            logger.warning(f"Unknown task type: {task_type}")
+def process_index_log(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Process INDEX_LOG task into an OpenSearch bulk index action."""
+    logger.debug(f"body: {body}")
+    payload = body["payload"]
+    logger.info(f"Processing log index task: {payload['id']}")
+    source = {field: payload[field] for field in INDEX_FIELDS}
+    source["log_metadata"] = orjson.dumps(payload["log_metadata"]).decode() if payload["log_metadata"] else ""
+    return {"_op_type": "index", "_index": INDEX_NAME, "_id": payload["id"], "_source": source}
 
-    except Exception as e:
-        logger.error(f"Error processing message: {str(e)}")
-        logger.exception(e)
-        raise
 
+def iter_actions(
+    records: List[Dict[str, Any]], message_ids: Dict[str, str], done_message_ids: Set[str]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily turn SQS records into OpenSearch bulk actions.
 
-def process_index_log(opensearch: OpenSearch, body: Dict[str, Any]) -> None:
-    """Process INDEX_LOG task."""
-    try:
-        create_index(opensearch)
-        logger.debug(f"body: {body}")
-        payload = body["payload"]
-        logger.info(f"Processing log index task: {payload['id']}")
-        opensearch.index(
-            index=INDEX_NAME,
-            id=payload["id"],
-            body={
-                "id": payload["id"],
-                "tenant_id": payload["tenant_id"],
-                "message": payload["message"],
-                "log_metadata": json.dumps(payload["log_metadata"]) if payload["log_metadata"] else "",
-                "created_at": payload["created_at"],
-                "user_id": payload["user_id"],
-                "action": payload["action"],
-                "resource_type": payload["resource_type"],
-                "severity": payload["severity"],
-            },
-        )
-        logger.info(f"Indexed log entry: {payload['id']}")
+    Args:
+        records (List[Dict[str, Any]]): SQS records of the batch
+        message_ids (Dict[str, str]): Filled with the SQS message ID of each yielded document ID
+        done_message_ids (Set[str]): Filled with the IDs of the messages which have nothing to index
+    """
+    for record in records:
+        # A malformed message only fails itself, the rest of the batch is still processed
+        try:
+            action = process_message(record)
+        except Exception as e:
+            logger.error(f"Error processing message {record['messageId']}: {str(e)}")
+            logger.exception(e)
+            continue
+
+        if action is None:
+            done_message_ids.add(record["messageId"])
+        else:
+            message_ids[str(action["_id"])] = record["messageId"]
+            yield action
 
-    except Exception as e:
-        logger.error(f"Error indexing log: {str(e)}")
-        raise
+
+def bulk_index(opensearch: OpenSearch, actions: Iterable[Dict[str, Any]]) -> Iterator[Tuple[str, bool]]:
+    """
+    Index the documents with `_bulk` requests, consuming the actions as a stream.
+
+    Yields:
+        Tuple[str, bool]: ID of each document and whether it was indexed
+    """
+    create_index(opensearch)
+    for ok, item in helpers.streaming_bulk(opensearch, actions, chunk_size=BULK_CHUNK_SIZE, raise_on_error=False):
+        result = item["index"]
+        if not ok:
+            logger.error(f"Error indexing log {result['_id']}: {result.get('error')}")
+        yield str(result["_id"]), ok
 
 
 def create_index(opensearch: OpenSearch) -> None:
     """
     Create the audit logs index in OpenSearch with appropriate mappings.
+
+    The check only runs once per execution environment, later calls return immediately.
     """
+    global index_ready
+    if index_ready:
+        return
+
     if not opensearch.indices.exists(index=INDEX_NAME):
         mappings = {
             "mappings": {
@@ -96,27 +146,66 @@ def create_index(opensearch: OpenSearch) -> None:
         logger.info(f"Created OpenSearch index: {INDEX_NAME}")
     else:
         logger.info(f"OpenSearch index: {INDEX_NAME} already exists")
+    index_ready = True
 
 
-def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    """Lambda function handler."""
-    try:
-        opensearch = opensearchpy.OpenSearch(
-            hosts=[os.getenv("OPENSEARCH_URL", "http://opensearch_con:9200")], timeout=30
+def delay_retries(records: List[Dict[str, Any]]) -> None:
+    """
+    Back off the retries of failed messages exponentially with their receive count.
+
+    Without this, a failing message is retried after the same fixed visibility timeout every time.
+    """
+    entries = []
+    for record in records:
+        receive_count = int(record["attributes"]["ApproximateReceiveCount"])
+        entries.append(
+            {
+                "Id": record["messageId"],
+                "ReceiptHandle": record["receiptHandle"],
+                "VisibilityTimeout": min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (receive_count - 1)),
+            }
         )
-        # Get messages from the event
-        records = event.get("Records", [])
 
-        if not records:
-            logger.warning("No records found in event")
-            return {"statusCode": 200, "body": "No messages to process"}
+    # A batch can hold more failed messages than SQS accepts in a single call
+    for start in range(0, len(entries), SQS_BATCH_MAX_ENTRIES):
+        try:
+            response = sqs_client.change_message_visibility_batch(
+                QueueUrl=SQS_QUEUE_URL, Entries=entries[start : start + SQS_BATCH_MAX_ENTRIES]
+            )
+            for failed in response.get("Failed", []):
+                logger.warning(f"Could not delay retry of message {failed['Id']}: {failed.get('Message')}")
+        except Exception as e:
+            # The messages are still retried after the queue visibility timeout
+            logger.error(f"Error delaying message retries: {str(e)}")
 
-        # Process each message
-        for record in records:
-            process_message(opensearch, record)
 
-        return {"statusCode": 200, "body": f"Processed {len(records)} messages"}
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Lambda function handler.
+
+    Failed messages are reported through `batchItemFailures` so that SQS only retries those.
+    """
+    # Get messages from the event
+    records = event.get("Records", [])
 
+    if not records:
+        logger.warning("No records found in event")
+        return {"batchItemFailures": []}
+
+    message_ids = {}
+    done_message_ids = set()
+    try:
+        actions = iter_actions(records, message_ids, done_message_ids)
+        for doc_id, ok in bulk_index(opensearch_client, actions):
+            if ok:
+                done_message_ids.add(message_ids[doc_id])
     except Exception as e:
         logger.error(f"Error in lambda handler: {str(e)}")
-        return {"statusCode": 500, "body": str(e)}
+
+    # Anything not confirmed as done is retried, including records left unprocessed by an error
+    failed_records = [record for record in records if record["messageId"] not in done_message_ids]
+    if failed_records:
+        delay_retries(failed_records)
+
+    logger.info(f"Processed {len(records)} messages, {len(failed_records)} failed")
+    return {"batchItemFailures": [{"itemIdentifier": record["messageId"]} for record in failed_records]}
@@ -1,13 +1,12 @@
+import asyncio
 import logging
 import sys
+import time
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi.exceptions import RequestValidationError
-from pyexpat.errors import messages
-from sqlalchemy import func, select
 from starlette import status
-from starlette.exceptions import HTTPException
 
 from src.schemas.response import ErrorDetail, ErrorResponse
 
@@ -17,21 +16,26 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 import uvicorn
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi import APIRouter, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import ValidationError
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.api.v1.endpoints import logs, search, stream, tenants
 from src.core.config import get_settings
-from src.database.pool import db_manager, get_db
+from src.database.pool import db_manager
 from src.middleware.dev_auth import MockAPIGatewayASGIMiddleware
-from src.models import AuditLog
+from src.services.log_service import LogService
+from src.services.sqs_service import get_sqs_service
+from src.services.stream_service import log_notifier
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# (monotonic time of the metrics, metrics response)
+_metrics_cache: tuple[float, dict] | None = None
+_metrics_lock = asyncio.Lock()
+
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
@@ -69,6 +73,15 @@ async def lifespan(_: FastAPI):
         # Stop background worker
         logger.info("✅ Background worker stopped")
 
+        # Send the SQS tasks still waiting for their batch
+        if get_sqs_service.cache_info().currsize:
+            await get_sqs_service().close()
+            logger.info("✅ SQS tasks drained")
+
+        # Close the connection listening to new logs
+        if log_notifier is not None:
+            await log_notifier.close()
+
         # Close database connection
         await db_manager.close_db()
         logger.info("✅ Database connection closed")
@@ -84,21 +97,15 @@ app = FastAPI(
     description="API for managing audit logs with multi-tenant support",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# # Add development middleware
-# app.middleware("http")(mock_api_gateway_header)
-# app.middleware("websocket")(mock_api_gateway_header)
-app.add_middleware(MockAPIGatewayASGIMiddleware)
+# Add development middleware, production requests don't go through it at all
+if settings.DEBUG:
+    app.add_middleware(MockAPIGatewayASGIMiddleware)
 
 # CORS configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(CORSMiddleware, **settings.get_cors_config())
 
 # Create API router with /api prefix
 api_router = APIRouter(prefix="/api/v1")
@@ -127,7 +134,9 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         errors=[error_detail],
         code=str(exc.status_code),
     )
-    return JSONResponse(status_code=exc.status_code, content=error_response.model_dump())
+    return Response(
+        content=error_response.model_dump_json(), status_code=exc.status_code, media_type="application/json"
+    )
 
 
 @app.exception_handler(ValidationError)
@@ -145,7 +154,11 @@ async def validation_exception_handler(request: Request, exc: ValidationError):
     error_response = ErrorResponse(
         status="error", message="Validation error occurred.", errors=errors, code="VALIDATION_ERROR"
     )
-    return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=error_response.model_dump())
+    return Response(
+        content=error_response.model_dump_json(),
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        media_type="application/json",
+    )
 
 
 @app.exception_handler(Exception)
@@ -156,14 +169,14 @@ async def generic_exception_handler(request: Request, exc: Exception):
     """
     # Log the full traceback for debugging (critical for 500 errors)
     logger.exception(f"Unhandled exception during request to {request.url}:")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"message": "An unexpected server error occurred. Please try again later."},
     )
 
 
 @app.exception_handler(RequestValidationError)
-async def validation_exception_handler(request: Request, exc: RequestValidationError):
+async def request_validation_exception_handler(request: Request, exc: RequestValidationError):
     """
     Handles Pydantic validation errors specifically for request bodies/queries/paths.
     This will generate the 422 responses in your custom format.
@@ -175,7 +188,11 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     error_response = ErrorResponse(
         status="error", message="Request validation failed.", errors=errors, code="VALIDATION_ERROR"
     )
-    return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, content=error_response.model_dump())
+    return Response(
+        content=error_response.model_dump_json(),
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        media_type="application/json",
+    )
 
 
 @app.get("/health", tags=["Mics"])
@@ -191,17 +208,22 @@ async def health_check():
     }
 
 
-@app.get("/metrics", tags=["Mics"])
-async def metrics(db: AsyncSession = Depends(get_db)):
-    """Get service metrics."""
+async def get_metrics() -> dict:
+    """
+    Get the service metrics, cached for `METRICS_CACHE_TTL` seconds.
 
-    try:
-        # Get database metrics
-        total_logs = await db.scalar(select(func.count(AuditLog.id)))
+    Concurrent scrapes of expired metrics wait for a single refresh, which is the only one using a database connection.
+    """
+    global _metrics_cache
+    async with _metrics_lock:
+        if _metrics_cache is not None and time.monotonic() - _metrics_cache[0] < settings.METRICS_CACHE_TTL:
+            return _metrics_cache[1]
+
+        async with db_manager.session_factory() as db:
+            total_logs = await LogService(db).get_log_count()
         # todo: get archived log
 
-        # Get service metrics
-        return {
+        metrics_response = {
             "database": {
                 "total_logs": total_logs,
                 "timescale": {
@@ -210,6 +232,16 @@ async def metrics(db: AsyncSession = Depends(get_db)):
                 },
             },
         }
+        _metrics_cache = (time.monotonic(), metrics_response)
+        return metrics_response
+
+
+@app.get("/metrics", tags=["Mics"])
+async def metrics():
+    """Get service metrics."""
+
+    try:
+        return await get_metrics()
 
     except Exception as e:
         logger.error(f"Error fetching metrics: {str(e)}")
@@ -217,4 +249,13 @@ async def metrics(db: AsyncSession = Depends(get_db)):
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Workers are separate processes, so the app has to be passed as an import string
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=settings.WEB_CONCURRENCY,
+        log_level=settings.LOG_LEVEL.lower(),
+    )
@@ -1,11 +1,12 @@
 """API endpoints for managing audit logs."""
 import csv
 import io
-import json
+import zlib
 from datetime import datetime
-from typing import List, Sequence
+from typing import AsyncIterator, List, Optional, Sequence, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import JSONResponse, StreamingResponse
@@ -13,16 +14,44 @@ from starlette.responses import JSONResponse, StreamingResponse
 from src.core import config
 from src.core.auth import get_current_user, role_required
 from src.database import get_db
+from src.database.pool import db_manager
 from src.enums.task_type import TaskType
+from src.models import AuditLog as LogModel
 from src.schemas import AuditLog, AuditLogCreate, AuditLogFilter, User, UserRole
-from src.schemas.response import DataResponse, ErrorResponse
+from src.schemas.response import Cursor, DataResponse, ErrorResponse
 from src.services.log_service import LogService
-from src.services.sqs_service import SQSService
+from src.services.sqs_service import SQSService, get_sqs_service
 
 router = APIRouter(prefix="/logs")
 
 settings = config.get_settings()
 
+CSV_FIELDNAMES = (
+    "id",
+    "tenant_id",
+    "created_at",
+    "user_id",
+    "session_data",
+    "action",
+    "resource_type",
+    "resource_id",
+    "ip_address",
+    "user_agent",
+    "message",
+    "severity",
+    "before_state",
+    "after_state",
+    "log_metadata",
+)
+# None of the field names need quoting, csv.writer terminates rows with \r\n
+CSV_HEADER_LINE = ",".join(CSV_FIELDNAMES) + "\r\n"
+EXPORT_MAX_ROWS = settings.EXPORT_MAX_ROWS
+# Size in characters of the chunks sent by the streaming exports
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_GZIP_LEVEL = 6
+# Number of rows encoded together by the JSON export
+EXPORT_JSON_BATCH_SIZE = 1000
+
 
 @router.post(
     "/",
@@ -31,7 +60,10 @@ settings = config.get_settings()
     dependencies=[Depends(role_required(UserRole.USER))],
 )
 async def create_log(
-    log: AuditLogCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)
+    log: AuditLogCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    sqs_service: SQSService = Depends(get_sqs_service),
 ) -> DataResponse[AuditLog]:
     """
     Create a new audit log entry.
@@ -40,6 +72,7 @@ async def create_log(
         log (AuditLogCreate): Data for the new audit log entry
         db (AsyncSession): Database session
         current_user (User): Current authenticated user
+        sqs_service (SQSService): Shared SQS service
 
     Returns:
         DataResponse[AuditLog]: Created audit log entry
@@ -55,7 +88,6 @@ async def create_log(
     result = await log_service.create_log(log_data)
 
     # Send indexing task to SQS
-    sqs_service = SQSService()
     await sqs_service.send_task(
         task_type=TaskType.INDEX_LOG,
         payload={
@@ -63,7 +95,7 @@ async def create_log(
             "tenant_id": current_user.tenant_id,
             "message": result.message,
             "log_metadata": result.log_metadata,
-            "created_at": result.created_at.isoformat(),
+            "created_at": result.created_at,
             "user_id": result.user_id,
             "action": result.action,
             "resource_type": result.resource_type,
@@ -99,17 +131,11 @@ async def get_logs(
         HTTPException: If user is not authorized
     """
     log_service = LogService(db)
-    return DataResponse(
-        data=await log_service.get_logs(
-            tenant_id=current_user.tenant_id,
-            user_id=log_filter.user_id,
-            resource_type=log_filter.resource_type,
-            action=log_filter.action,
-            severity=log_filter.severity,
-            start_date=log_filter.start_date,
-            end_date=log_filter.end_date,
-        )
-    )
+    logs = await log_service.get_logs(tenant_id=current_user.tenant_id, **log_filter.model_dump(exclude_none=True))
+    next_cursor = None
+    if logs and len(logs) == log_filter.limit:
+        next_cursor = Cursor(after_created_at=logs[-1].created_at, after_id=logs[-1].id)
+    return DataResponse(data=AuditLog.from_models(logs), next_cursor=next_cursor)
 
 
 @router.get(
@@ -148,91 +174,72 @@ async def get_log_by_id(
     dependencies=[Depends(role_required(UserRole.AUDITOR))],
 )
 async def export_logs_csv(
+    request: Request,
     log_filter: AuditLogFilter = Depends(),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> StreamingResponse:
     """
-    Export audit logs in CSV format and send to SQS queue.
+    Export audit logs in CSV format.
+
+    Rows are streamed from the database and written to the response as they are read.
 
     Args:
+        request (Request): Export request
         log_filter (AuditLogFilter): Export filter parameters
         db (AsyncSession): Database session
         current_user (User): session_user
 
     Returns:
-        StreamingResponse: Export started successfully
+        StreamingResponse: CSV file of the audit logs
         ErrorResponse: Exceed number of audit log entries
     """
-    # Get logs from the database
-    log_service = LogService(db)
-    logs = await log_service.get_logs(
-        tenant_id=current_user.tenant_id,
-        user_id=log_filter.user_id,
-        resource_type=log_filter.resource_type,
-        action=log_filter.action,
-        severity=log_filter.severity,
-        start_date=log_filter.start_date,
-        end_date=log_filter.end_date,
-    )
+    filters = export_filters(log_filter, current_user)
 
-    validate_export_limit(len(logs))
-
-    # Create CSV buffer
-    csv_buffer = io.StringIO()
-    writer = csv.DictWriter(
-        csv_buffer,
-        fieldnames=[
-            "id",
-            "tenant_id",
-            "created_at",
-            "user_id",
-            "session_data",
-            "action",
-            "resource_type",
-            "resource_id",
-            "ip_address",
-            "user_agent",
-            "message",
-            "severity",
-            "before_state",
-            "after_state",
-            "log_metadata",
-        ],
-    )
-    writer.writeheader()
-
-    # Write logs to CSV
-    for log in logs:
-        writer.writerow(
-            {
-                "id": log.id,
-                "tenant_id": log.tenant_id,
-                "created_at": log.created_at.isoformat(),
-                "user_id": log.user_id,
-                "session_data": json.dumps(log.session_data),
-                "action": log.action,
-                "resource_type": log.resource_type,
-                "resource_id": log.resource_id,
-                "ip_address": log.ip_address,
-                "user_agent": log.user_agent,
-                "message": log.message,
-                "severity": log.severity,
-                "before_state": json.dumps(log.before_state) if log.before_state else None,
-                "after_state": json.dumps(log.after_state) if log.after_state else None,
-                "log_metadata": json.dumps(log.log_metadata) if log.log_metadata else None,
-            }
-        )
-    csv_buffer.seek(0)
-    return StreamingResponse(
-        csv_buffer,
-        media_type="application/json",
-        headers={"Content-Disposition": f"attachment; filename=audit_logs_{datetime.now().strftime('%Y%m%d')}.csv"},
-    )
+    # Validate before streaming, the status code can't change once the body has started
+    log_service = LogService(db)
+    validate_export_limit(await log_service.count_logs(**filters, limit=EXPORT_MAX_ROWS + 1))
+
+    async def generate_csv() -> AsyncIterator[str]:
+        buffer = io.StringIO()
+        buffer.write(CSV_HEADER_LINE)
+        writer = csv.writer(buffer)
+
+        async for log in stream_export_logs(filters):
+            # Same order as CSV_FIELDNAMES
+            writer.writerow(
+                (
+                    log.id,
+                    log.tenant_id,
+                    log.created_at.isoformat(),
+                    log.user_id,
+                    orjson.dumps(log.session_data).decode(),
+                    log.action,
+                    log.resource_type,
+                    log.resource_id,
+                    log.ip_address,
+                    log.user_agent,
+                    log.message,
+                    log.severity,
+                    dump_json_column(log.before_state),
+                    dump_json_column(log.after_state),
+                    dump_json_column(log.log_metadata),
+                )
+            )
+            # Send the rows in chunks rather than one write per row
+            if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+
+        yield buffer.getvalue()
+
+    return export_response(request, generate_csv(), media_type="text/csv", extension="csv")
 
 
 @router.get("/export/json", tags=["export"], description="Export audit logs in JSON format")
 async def export_logs_json(
+    request: Request,
     log_filter: AuditLogFilter = Depends(),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
@@ -240,37 +247,150 @@ async def export_logs_json(
     """
     Export audit logs in JSON format
 
+    The JSON array is streamed, rows are encoded as they are read from the database.
+
     Args:
+        request (Request): Export request
         log_filter (AuditLogFilter): Export filter parameters
         db (AsyncSession): Database session
         current_user (User): session_user
 
     Returns:
-        StreamingResponse: Export started successfully
+        StreamingResponse: JSON file of the audit logs
         ErrorResponse: Export failed due to exceed number of audit logs
     """
-    # Get logs from the database
+    filters = export_filters(log_filter, current_user)
+
+    # Validate before streaming, the status code can't change once the body has started
     log_service = LogService(db)
-    logs = await log_service.get_logs(
-        tenant_id=current_user.tenant_id,
-        user_id=log_filter.user_id,
-        resource_type=log_filter.resource_type,
-        action=log_filter.action,
-        severity=log_filter.severity,
-        start_date=log_filter.start_date,
-        end_date=log_filter.end_date,
-    )
+    validate_export_limit(await log_service.count_logs(**filters, limit=EXPORT_MAX_ROWS + 1))
 
-    validate_export_limit(len(logs))
-    output = io.StringIO()
-    json.dump([log.to_dict() for log in logs], output)
-    output.seek(0)
+    async def generate_json() -> AsyncIterator[bytes]:
+        yield b"["
+        rows = []
+        separator = b""
+        async for log in stream_export_logs(filters):
+            rows.append(log.to_dict())
+            # Encode the rows in batches with a single orjson call, sent without their enclosing brackets
+            if len(rows) >= EXPORT_JSON_BATCH_SIZE:
+                yield separator + orjson.dumps(rows)[1:-1]
+                separator = b","
+                rows.clear()
 
-    return StreamingResponse(
-        output,
-        media_type="application/json",
-        headers={"Content-Disposition": f"attachment; filename=audit_logs_{datetime.now().strftime('%Y%m%d')}.json"},
-    )
+        if rows:
+            yield separator + orjson.dumps(rows)[1:-1]
+        yield b"]"
+
+    return export_response(request, generate_json(), media_type="application/json", extension="json")
+
+
+def export_response(
+    request: Request, content: AsyncIterator[Union[str, bytes]], media_type: str, extension: str
+) -> StreamingResponse:
+    """
+    Build the streaming response of an export, gzip compressed when the client accepts it.
+
+    Args:
+        request (Request): Export request
+        content (AsyncIterator[Union[str, bytes]]): Chunks of the exported file
+        media_type (str): Media type of the exported file
+        extension (str): File extension of the exported file
+
+    Returns:
+        StreamingResponse: Exported file as an attachment
+    """
+    headers = {
+        "Content-Disposition": f"attachment; filename=audit_logs_{datetime.now().strftime('%Y%m%d')}.{extension}",
+        "Vary": "Accept-Encoding",
+    }
+    if accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        content = gzip_chunks(content)
+
+    return StreamingResponse(content, media_type=media_type, headers=headers)
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Check whether an Accept-Encoding header accepts gzip, taking the quality values into account.
+
+    Args:
+        accept_encoding (str): Value of the Accept-Encoding header
+
+    Returns:
+        bool: True if gzip, or any coding when gzip isn't listed, has a non-zero quality
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        param_name, _, param_value = params.partition("=")
+        if param_name.strip().lower() == "q":
+            try:
+                quality = float(param_value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+async def gzip_chunks(chunks: AsyncIterator[Union[str, bytes]]) -> AsyncIterator[bytes]:
+    """
+    Compress a stream of chunks into a single gzip stream.
+
+    Args:
+        chunks (AsyncIterator[Union[str, bytes]]): Chunks to compress, text is encoded in UTF-8
+
+    Yields:
+        bytes: Compressed chunks
+    """
+    # wbits 31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def dump_json_column(value: Optional[dict]) -> Optional[str]:
+    """Encode a JSON column of the CSV export, empty values are left empty."""
+    return orjson.dumps(value).decode() if value else None
+
+
+def export_filters(log_filter: AuditLogFilter, current_user: User) -> dict:
+    """
+    Build the `LogService` filters of an export, exports are not paginated.
+
+    Args:
+        log_filter (AuditLogFilter): Export filter parameters
+        current_user (User): session_user
+
+    Returns:
+        dict: Filters set on the export, scoped to the tenant of the user
+    """
+    return {
+        "tenant_id": current_user.tenant_id,
+        **log_filter.model_dump(exclude_none=True, exclude={"page", "limit", "after_created_at", "after_id"}),
+    }
+
+
+async def stream_export_logs(filters: dict) -> AsyncIterator[LogModel]:
+    """
+    Stream the audit logs to export using a dedicated database session.
+
+    The request session is closed as soon as the endpoint returns, before the body of a streaming response is sent.
+
+    Args:
+        filters (dict): Filters of `LogService.stream_logs`
+
+    Yields:
+        LogModel: Audit logs matching the filters
+    """
+    async with db_manager.session_factory() as session:
+        # Logs created since the count are not exported past the limit
+        async for log in LogService(session).stream_logs(**filters, limit=EXPORT_MAX_ROWS):
+            yield log
 
 
 def validate_export_limit(log_count: int) -> None:
@@ -281,7 +401,10 @@ def validate_export_limit(log_count: int) -> None:
         log_count (int): Number of logs
 
     Raises:
-        ValueError: If export size exceeds the allowed limit
+        HTTPException: If export size exceeds the allowed limit
     """
-    if log_count > config.get_settings().EXPORT_MAX_ROWS:
-        raise ValueError(f"Export size exceeds maximum allowed rows ({config.get_settings().EXPORT_MAX_ROWS})")
+    if log_count > EXPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Export size exceeds maximum allowed rows ({EXPORT_MAX_ROWS})",
+        )
@@ -9,7 +9,7 @@ from src.core import config
 from src.core.auth import get_current_user, role_required
 from src.schemas import AuditLogSearch, User, UserRole
 from src.schemas.response import DataResponse
-from src.services.search_service import SearchService
+from src.services.search_service import SearchService, get_search_service
 
 router = APIRouter(prefix="/logs")
 logger = logging.getLogger(__name__)
@@ -23,7 +23,11 @@ settings = config.get_settings()
     dependencies=[Depends(role_required(UserRole.AUDITOR))],
 )
 async def search_logs(
-    search: AuditLogSearch, current_user: User = Depends(get_current_user), page: int = 1, limit: int = 100
+    search: AuditLogSearch,
+    current_user: User = Depends(get_current_user),
+    search_service: SearchService = Depends(get_search_service),
+    page: int = 1,
+    limit: int = 100,
 ) -> DataResponse:
     """
     Search audit logs using full-text search.
@@ -31,13 +35,13 @@ async def search_logs(
     Args:
         search (AuditLogSearch): Search parameters
         current_user (User): Current authenticated user
+        search_service (SearchService): Shared search service
         page (int): Page number
         limit (int): Number of results per page
 
     Returns:
         DataResponse: Opensearch results
     """
-    search_service = SearchService()
     try:
         # Convert filters to dictionary
         filters = search.filters.model_dump() if search.filters else {}
@@ -46,7 +50,7 @@ async def search_logs(
             tenant_id=current_user.tenant_id, query=search.query, filters=filters, page=page, limit=limit
         )
 
-        return DataResponse(data={"total": len(results), "results": results})
+        return DataResponse(data=results)
     except Exception as e:
         # logger.exception(f"Search failed: {str(e)}")
         logger.exception(e)
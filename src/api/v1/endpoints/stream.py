@@ -1,12 +1,11 @@
 """API endpoints for real-time log streaming."""
 
+import hashlib
 import logging
 
-from fastapi import APIRouter, Depends, WebSocket
+from fastapi import APIRouter, Depends, Request, Response, WebSocket, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.responses import HTMLResponse
 
-from src.core import config
 from src.core.auth import get_current_user, role_required
 from src.database.pool import get_db
 from src.schemas import User, UserRole
@@ -14,7 +13,6 @@ from src.services.stream_service import StreamService
 
 router = APIRouter(prefix="/logs")
 
-settings = config.get_settings()
 logger = logging.getLogger(__name__)
 
 
@@ -39,14 +37,7 @@ async def stream_logs(
         raise
 
 
-@router.get("/board", dependencies=[Depends(role_required(UserRole.AUDITOR))])
-async def board():
-    """
-    Real-time log streaming endpoint.
-    Returns:
-        HTMLResponse: A demo page for log streaming
-    """
-    html = """
+BOARD_HTML = """
     <!DOCTYPE html>
     <html>
         <head>
@@ -173,5 +164,25 @@ async def board():
             </script>
         </body>
     </html>
+    """.encode()
+BOARD_ETAG = f'"{hashlib.blake2b(BOARD_HTML, digest_size=8).hexdigest()}"'
+
+
+@router.get("/board", dependencies=[Depends(role_required(UserRole.AUDITOR))])
+async def board(request: Request) -> Response:
+    """
+    Real-time log streaming endpoint.
+
+    The page is static, it is served with an ETag so that browsers revalidate it instead of downloading it again.
+
+    Args:
+        request (Request): Page request
+
+    Returns:
+        Response: A demo page for log streaming, or 304 if the browser already has it
     """
-    return HTMLResponse(html)
+    if request.headers.get("if-none-match") == BOARD_ETAG:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": BOARD_ETAG})
+    return Response(
+        BOARD_HTML, media_type="text/html", headers={"ETag": BOARD_ETAG, "Cache-Control": "private, no-cache"}
+    )
@@ -2,55 +2,167 @@
 
 import asyncio
 import logging
+import random
+import time
+from uuid import uuid4
 
+import orjson
 from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
-from src.database.timescale_init import init_timescale
+from src.core import config
+from src.database.timescale_init import init_timescale, refresh_count_aggregate
 from src.models import Base, Tenant
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+settings = config.get_settings()
+
+# Seconds a health check result is reused for
+HEALTH_CHECK_TTL = 5.0
+
+# Connectivity probe, built once instead of on every check
+SELECT_1 = text("SELECT 1")
+
+
+def engine_options(pool_size: int, max_overflow: int, pool_timeout: int) -> dict:
+    """
+    Build the pooling options of an engine.
+
+    Behind PgBouncer in transaction mode, connections are pooled by PgBouncer and a statement prepared on one server
+    connection may be executed on another, so prepared statements are neither cached nor reused by name.
+
+    Args:
+        pool_size: Number of connections kept in the pool
+        max_overflow: Number of connections opened above the pool size under load
+        pool_timeout: Seconds to wait for a connection of the pool
+
+    Returns:
+        Keyword arguments of `create_async_engine`
+    """
+    if settings.USE_PGBOUNCER:
+        return {
+            "poolclass": NullPool,
+            "connect_args": {
+                "timeout": settings.DB_CONNECT_TIMEOUT,
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            },
+        }
+
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": pool_timeout,
+        "pool_recycle": 3600,
+        "pool_pre_ping": True,
+        "connect_args": {"timeout": settings.DB_CONNECT_TIMEOUT},
+    }
+
+
+def dump_json(value) -> str:
+    """
+    Serialize a JSONB value with orjson, faster than the `json.dumps` SQLAlchemy uses by default.
+
+    Args:
+        value: Value of a JSONB column
+
+    Returns:
+        JSON document as a string, as expected by the asyncpg JSONB codec
+    """
+    return orjson.dumps(value).decode()
+
+
+def retry_delay(attempt: int) -> float:
+    """
+    Compute the delay before the next connection attempt, an exponential backoff with jitter.
+
+    Args:
+        attempt: Number of the failed attempt, starting at 0
+
+    Returns:
+        Seconds to wait, between half and all of the capped backoff
+    """
+    backoff = min(settings.DB_CONNECT_RETRY_CAP, settings.DB_CONNECT_RETRY_BASE * 2**attempt)
+    return backoff * (0.5 + random.random() / 2)
+
 
 class AsyncDatabaseManager:
     def __init__(self):
         self.engine: AsyncEngine | None = None
         self.session_factory: sessionmaker | None = None
+        # Small engine of its own so that health checks don't wait on a pool saturated by requests
+        self.health_engine: AsyncEngine | None = None
+        # (monotonic time of the check, result)
+        self._health_cache: tuple[float, bool] | None = None
+        self._health_lock = asyncio.Lock()
 
-    async def init_connection(self, database_url: str, max_retries: int = 5, retry_delay: int = 2) -> None:
-        """Initialize database connection pool with retry logic."""
-        current_retry = 0
+    async def init_connection(self, database_url: str) -> None:
+        """
+        Initialize database connection pool with retry logic.
 
-        while current_retry < max_retries:
+        Failed attempts are retried with an exponential backoff and jitter, so that replicas restarted together don't
+        all reconnect at the same instant.
+
+        Args:
+            database_url: URL of the database
+        """
+        max_retries = settings.DB_CONNECT_MAX_RETRIES
+
+        for attempt in range(max_retries):
             try:
                 self.engine = create_async_engine(
                     database_url,
                     echo=False,
-                    pool_size=5,
-                    max_overflow=10,
-                    pool_timeout=30,
-                    pool_recycle=3600,
-                    pool_pre_ping=True,
+                    json_serializer=dump_json,
+                    json_deserializer=orjson.loads,
+                    **engine_options(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, settings.DB_POOL_TIMEOUT),
                 )
                 self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
-                logger.info("Database connection pool initialized")
+                self.health_engine = create_async_engine(
+                    database_url,
+                    echo=False,
+                    json_serializer=dump_json,
+                    json_deserializer=orjson.loads,
+                    **engine_options(2, 0, 2),
+                )
+                # Engines connect lazily, open a connection so that an unreachable database is retried here
+                async with self.engine.connect() as conn:
+                    await conn.execute(SELECT_1)
+
+                if settings.USE_PGBOUNCER:
+                    logger.info("Database connection pool initialized: pooling delegated to PgBouncer")
+                else:
+                    logger.info(
+                        f"Database connection pool initialized: {settings.DB_POOL_SIZE}+{settings.DB_MAX_OVERFLOW} "
+                        f"connections, {settings.DB_POOL_TIMEOUT}s timeout"
+                    )
                 return
             except Exception as e:
-                logger.warning(f"Attempt {current_retry + 1}/{max_retries} failed: {e}")
-                if current_retry < max_retries - 1:
-                    logger.info(f"Retrying in {retry_delay} seconds...")
-                    await asyncio.sleep(retry_delay)
-                current_retry += 1
+                logger.warning(f"Attempt {attempt + 1}/{max_retries} failed: {e}")
+                await self.close_db()
+                if attempt < max_retries - 1:
+                    delay = retry_delay(attempt)
+                    logger.info(f"Retrying in {delay:.2f} seconds...")
+                    await asyncio.sleep(delay)
 
         logger.error(f"Failed to initialize database connection after {max_retries} attempts")
         raise ConnectionError("Failed to connect to database after multiple attempts")
 
     async def init_db(self):
-        # Drop tables if exists
-        await self.drop_table_if_exists_raw_sql("audit_logs")
-        await self.drop_table_if_exists_raw_sql("tenants")
+        """Create the tables and TimescaleDB configuration that don't exist yet, existing data is kept."""
+        if settings.RESET_DB_ON_STARTUP:
+            # The log count aggregate depends on the logs table, it is dropped first
+            async with self.engine.begin() as conn:
+                await conn.execute(text("DROP MATERIALIZED VIEW IF EXISTS audit_logs_count_daily;"))
+            # Drop tables if exists
+            await self.drop_table_if_exists_raw_sql("audit_logs")
+            await self.drop_table_if_exists_raw_sql("tenants")
 
         # Create all tables and initialize TimescaleDB
         try:
@@ -60,10 +172,15 @@ class AsyncDatabaseManager:
                 logger.info("Base tables created successfully")
 
                 # Initialize TimescaleDB
-                await init_timescale(conn)
+                count_aggregate_created = await init_timescale(conn)
                 logger.info("TimescaleDB initialized successfully")
-                # Log success
-                logger.info("Database initialization completed successfully")
+
+            if count_aggregate_created:
+                # Count the logs which existed before the aggregate
+                await refresh_count_aggregate(self.engine)
+                logger.info("Log count aggregate materialized")
+            # Log success
+            logger.info("Database initialization completed successfully")
 
             await self.populate_dummy_tenants()
 
@@ -88,6 +205,8 @@ class AsyncDatabaseManager:
         if self.engine:
             await self.engine.dispose()
             logger.info("Database connections closed")
+        if self.health_engine:
+            await self.health_engine.dispose()
 
     async def get_session(self):
         """Get database session"""
@@ -105,37 +224,59 @@ class AsyncDatabaseManager:
                 await session.close()
 
     async def health_check(self):
-        """Check database health"""
-        try:
-            async with self.session_factory() as session:
-                await session.execute(text("SELECT 1"))
-                return True
-        except Exception as e:
-            logger.error(f"Database health check failed: {e}")
-            return False
+        """Check database health
+
+        The result is reused for `HEALTH_CHECK_TTL` seconds, and concurrent checks wait for a single query.
+        """
+        async with self._health_lock:
+            if self._health_cache and time.monotonic() - self._health_cache[0] < HEALTH_CHECK_TTL:
+                return self._health_cache[1]
+
+            try:
+                async with self.health_engine.connect() as conn:
+                    await conn.execute(SELECT_1)
+                    is_healthy = True
+            except Exception as e:
+                logger.error(f"Database health check failed: {e}")
+                is_healthy = False
+
+            self._health_cache = (time.monotonic(), is_healthy)
+            return is_healthy
 
     def get_pool_status(self):
         """Get connection pool status"""
         if not self.engine:
             return {"status": "not_initialized"}
+        if settings.USE_PGBOUNCER:
+            return {"status": "pgbouncer"}
 
         pool = self.engine.pool
+        health_pool = self.health_engine.pool
         return {
             "pool_size": pool.size(),
             "checked_in": pool.checkedin(),
             "checked_out": pool.checkedout(),
             "overflow": pool.overflow(),
+            "health_pool": {
+                "pool_size": health_pool.size(),
+                "checked_in": health_pool.checkedin(),
+                "checked_out": health_pool.checkedout(),
+            },
         }
 
     async def populate_dummy_tenants(self):
-        """Populate dummy tenants"""
+        """Populate dummy tenants, the ones that already exist are kept"""
         async with self.session_factory() as session:
-            session.add_all(
-                [
-                    Tenant(name="Tenant 1", description="Dummy Tenant 1"),
-                    Tenant(name="Tenant 2", description="Dummy Tenant 2"),
-                    Tenant(name="Tenant 3", description="Dummy Tenant 3"),
-                ]
+            await session.execute(
+                insert(Tenant)
+                .values(
+                    [
+                        {"name": "Tenant 1", "description": "Dummy Tenant 1"},
+                        {"name": "Tenant 2", "description": "Dummy Tenant 2"},
+                        {"name": "Tenant 3", "description": "Dummy Tenant 3"},
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=["name"])
             )
             await session.commit()
 
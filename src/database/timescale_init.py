@@ -7,72 +7,148 @@ from src.core import config
 
 settings = config.get_settings()
 
+# Create hypertable with multidimensional partitioning
+CREATE_HYPERTABLE_SQL = """
+    SELECT create_hypertable(
+        'audit_logs',
+        'created_at',
+        chunk_time_interval => INTERVAL '1 month',
+        partitioning_column => 'tenant_id',
+        number_partitions => 4,
+        create_default_indexes => FALSE,
+        if_not_exists => TRUE
+    );
+"""
 
-async def create_hypertable(conn: AsyncConnection):
-    """
-    Create TimescaleDB hypertable with multidimensional partitioning.
-    """
-    # Create hypertable
-    await conn.execute(
-        text(
-            """
-            SELECT create_hypertable(
-                'audit_logs',
-                'created_at',
-                chunk_time_interval => INTERVAL '1 month',
-                partitioning_column => 'tenant_id',
-                number_partitions => 4
-            );
-        """
-        )
-    )
+# Single column and TimescaleDB default indexes of earlier versions, covered by the model indexes
+DROP_REDUNDANT_INDEXES_SQL = """
+    DROP INDEX IF EXISTS ix_audit_logs_tenant_id;
+    DROP INDEX IF EXISTS ix_audit_logs_created_at;
+    DROP INDEX IF EXISTS ix_audit_logs_user_id;
+    DROP INDEX IF EXISTS ix_audit_logs_severity;
+    DROP INDEX IF EXISTS audit_logs_created_at_idx;
+    DROP INDEX IF EXISTS audit_logs_tenant_id_created_at_idx;
+"""
 
-
-async def add_policies(conn: AsyncConnection):
-    # Set compression settings
-    await conn.execute(
-        text(
-            """
+ADD_POLICIES_SQL = """
+    -- Set compression settings, they can't be changed anymore once chunks are compressed
+    DO $$
+    BEGIN
+        IF NOT (
+            SELECT compression_enabled FROM timescaledb_information.hypertables
+            WHERE hypertable_name = 'audit_logs'
+        ) THEN
             ALTER TABLE audit_logs SET (
                 timescaledb.compress = TRUE,
                 timescaledb.compress_segmentby = 'tenant_id',
                 timescaledb.compress_orderby = 'created_at DESC'
-                );
-            """
-        )
-    )
-
-    # Then add the compression policy
-    await conn.execute(
-        text(
-            """
-            SELECT add_compression_policy(
-                'audit_logs',
-                INTERVAL '7 days',
-                if_not_exists => TRUE
             );
-        """
-        )
-    )
+        END IF;
+    END
+    $$;
 
-    # Set retention policy
-    await conn.execute(
-        text(
-            """
-            SELECT add_retention_policy(
-                'audit_logs',
-                INTERVAL '90 days',
-                if_not_exists => TRUE
-            );
-        """
-        )
+    -- Then add the compression policy
+    SELECT add_compression_policy(
+        'audit_logs',
+        INTERVAL '7 days',
+        if_not_exists => TRUE
+    );
+
+    -- Set retention policy
+    SELECT add_retention_policy(
+        'audit_logs',
+        INTERVAL '90 days',
+        if_not_exists => TRUE
+    );
+"""
+
+# Daily log counts per tenant, counting the logs is then a sum over days instead of a scan of the rows
+CREATE_COUNT_AGGREGATE_SQL = """
+    -- WITH NO DATA can run in a transaction, the existing logs are materialized by REFRESH_COUNT_AGGREGATE_SQL and the
+    -- new ones by the refresh policy
+    CREATE MATERIALIZED VIEW IF NOT EXISTS audit_logs_count_daily
+    WITH (timescaledb.continuous, timescaledb.materialized_only = FALSE) AS
+    SELECT time_bucket(INTERVAL '1 day', created_at) AS bucket, tenant_id, count(*) AS log_count
+    FROM audit_logs
+    GROUP BY bucket, tenant_id
+    WITH NO DATA;
+
+    -- Chunks are compressed after 7 days, buckets are only refreshed before that
+    SELECT add_continuous_aggregate_policy(
+        'audit_logs_count_daily',
+        start_offset => INTERVAL '3 days',
+        end_offset => INTERVAL '1 hour',
+        schedule_interval => INTERVAL '1 hour',
+        if_not_exists => TRUE
+    );
+
+    -- Forget the counts of the logs dropped by the retention policy
+    SELECT add_retention_policy(
+        'audit_logs_count_daily',
+        INTERVAL '90 days',
+        if_not_exists => TRUE
+    );
+"""
+
+COUNT_AGGREGATE_EXISTS_SQL = """
+    SELECT EXISTS (
+        SELECT FROM timescaledb_information.continuous_aggregates WHERE view_name = 'audit_logs_count_daily'
     )
+"""
+
+# The policy only refreshes the last days, the older logs are materialized once when the aggregate is created.
+# A refresh can't run in a transaction.
+REFRESH_COUNT_AGGREGATE_SQL = """
+    CALL refresh_continuous_aggregate('audit_logs_count_daily', NULL, now() - INTERVAL '1 hour')
+"""
+
 
+# Notify the streams of the tenant of each new log, notifications of a transaction are sent once on commit
+NOTIFY_NEW_LOGS_SQL = """
+    CREATE OR REPLACE FUNCTION notify_audit_log_new() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('audit_log_new', NEW.tenant_id::text);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
 
-async def init_timescale(conn: AsyncConnection):
+    DROP TRIGGER IF EXISTS audit_logs_notify_new ON audit_logs;
+    CREATE TRIGGER audit_logs_notify_new
+    AFTER INSERT ON audit_logs
+    FOR EACH ROW EXECUTE FUNCTION notify_audit_log_new();
+"""
+
+
+async def init_timescale(conn: AsyncConnection) -> bool:
     """
     Initialize TimescaleDB with all configuration
+
+    The statements are sent as one script, asyncpg runs a query without arguments with the simple query protocol,
+    which accepts several statements in a single round trip.
+
+    Returns:
+        bool: Whether the count aggregate was created, it then has to be filled with `refresh_count_aggregate` once the
+        transaction is committed
+    """
+    raw_connection = await conn.get_raw_connection()
+    count_aggregate_exists = await raw_connection.driver_connection.fetchval(COUNT_AGGREGATE_EXISTS_SQL)
+    await raw_connection.driver_connection.execute(
+        CREATE_HYPERTABLE_SQL
+        + DROP_REDUNDANT_INDEXES_SQL
+        + ADD_POLICIES_SQL
+        + CREATE_COUNT_AGGREGATE_SQL
+        + NOTIFY_NEW_LOGS_SQL
+    )
+    return not count_aggregate_exists
+
+
+async def refresh_count_aggregate(engine: AsyncEngine) -> None:
     """
+    Materialize the daily counts of all the logs older than the refresh window of the policy.
 
-    await create_hypertable(conn)
-    await add_policies(conn)
+    Args:
+        engine: Engine to run the refresh on, outside of any transaction
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(REFRESH_COUNT_AGGREGATE_SQL))
@@ -9,6 +9,5 @@ class TaskType(str, Enum):
     INDEX_LOG = "INDEX_LOG"
     ARCHIVE_LOG = "ARCHIVE_LOG"
 
-    def __str__(self) -> str:
-        """Return string representation of the enum value."""
-        return self.value
+    # Return the value with the C implementation of str, as StrEnum does, instead of a Python level method
+    __str__ = str.__str__
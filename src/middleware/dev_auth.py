@@ -1,51 +1,25 @@
-from fastapi import Request, Response
-from starlette.datastructures import MutableHeaders
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp, Receive, Scope, Send
 
-from src.core.config import get_settings
 from src.schemas import UserRole
 
-settings = get_settings()
-
-
-async def mock_api_gateway_header(request: Request, call_next) -> Response:
-    if settings.DEBUG:
-        # Create a mutable copy of the headers
-        headers = dict(request.headers)
-
-        # Set mock user data
-        mock_user = {
-            "X-User-Id": "1",
-            "X-User-Role": UserRole.ADMIN.value,  # Convert enum to string
-            "X-User-Name": "Mock Admin",
-            "X-Tenant-Id": "1",
-        }
-
-        # Update headers with mock data
-        headers.update(mock_user)
-
-        # Create a new request with updated headers
-        request.scope["headers"] = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
-
-    response = await call_next(request)
-    return response
+# Raw ASGI headers, encoded once
+MOCK_USER_HEADERS = [
+    (b"x-user-id", b"1"),
+    (b"x-user-role", UserRole.ADMIN.value.encode()),
+    (b"x-user-name", b"Mock Admin"),
+    (b"x-tenant-id", b"1"),
+]
 
 
 class MockAPIGatewayASGIMiddleware:
+    """Add the user headers of the API gateway to the requests, only installed in DEBUG mode."""
+
     def __init__(self, app: ASGIApp):
         self.app = app
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send):
-        if settings.DEBUG and scope["type"] in ["http", "websocket"]:
-            mock_user_headers = [
-                (b"x-user-id", b"1"),
-                (b"x-user-role", UserRole.ADMIN.value.encode()),
-                (b"x-user-name", b"Mock Admin"),
-                (b"x-tenant-id", b"1"),
-            ]
-
+        if scope["type"] in ["http", "websocket"]:
             # Add mock headers to existing headers
-            scope["headers"] = scope.get("headers", []) + mock_user_headers
+            scope["headers"] = scope.get("headers", []) + MOCK_USER_HEADERS
 
         await self.app(scope, receive, send)
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Any, Dict, Optional
 
-from sqlalchemy import DateTime, ForeignKey, Index, Text, func
+from sqlalchemy import DateTime, ForeignKey, Index, Text, func, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.types import Enum
@@ -16,6 +16,7 @@ class AuditLog(Base, TimestampMixin):
     __tablename__ = "audit_logs"
 
     # Indexes are now defined separately using __table_args__ as a dictionary
+    # Every query is scoped to a tenant, so the columns are only indexed after tenant_id, no single column btree
     __table_args__ = (
         # Regular indexes
         Index("idx_audit_logs_tenant_created", "tenant_id", "created_at", postgresql_using="btree"),
@@ -31,24 +32,31 @@ class AuditLog(Base, TimestampMixin):
         Index(
             "idx_audit_logs_tenant_severity_created", "tenant_id", "severity", "created_at", postgresql_using="btree"
         ),
+        # Small index for the frequent lookups of errors, the enum is stored by name
+        Index(
+            "idx_audit_logs_tenant_high_severity_created",
+            "tenant_id",
+            "created_at",
+            postgresql_using="btree",
+            postgresql_where=text("severity IN ('ERROR', 'CRITICAL')"),
+        ),
         Index("idx_audit_logs_created_at", "created_at", postgresql_using="brin"),
     )
 
     # Composite primary key for TimescaleDB partitioning
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     tenant_id: Mapped[int] = mapped_column(
-        ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True, nullable=False, index=True
+        ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True, nullable=False
     )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         primary_key=True,
         default=func.now(),
         nullable=False,
-        index=True,
         comment="Timestamp when the log was created",
     )
     # Log details
-    user_id: Mapped[str] = mapped_column(Text, nullable=False, index=True)
+    user_id: Mapped[str] = mapped_column(Text, nullable=False)
     session_data: Mapped[Dict[str, Any]] = mapped_column(JSONB, nullable=False)
     action: Mapped[LogAction] = mapped_column(nullable=False)
     resource_type: Mapped[str] = mapped_column(Text, nullable=False)
@@ -59,9 +67,7 @@ class AuditLog(Base, TimestampMixin):
     log_metadata: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, nullable=True)
     before_state: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, nullable=True)
     after_state: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, nullable=True)
-    severity: Mapped[LogSeverity] = mapped_column(
-        Enum(LogSeverity), nullable=False, default=LogSeverity.INFO, index=True
-    )
+    severity: Mapped[LogSeverity] = mapped_column(Enum(LogSeverity), nullable=False, default=LogSeverity.INFO)
 
     def __repr__(self):
         return f"tenant_id={self.tenant_id}, action={self.action})"
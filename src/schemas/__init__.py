@@ -1,6 +1,6 @@
 """Schemas package."""
 
-from .audit_log import AuditLog, AuditLogCreate, AuditLogFilter
+from .audit_log import AuditLog, AuditLogCreate, AuditLogFilter, StreamedAuditLog
 from .enums import LogAction, LogSeverity
 from .search import AuditLogSearch
 from .tenant import Tenant, TenantCreate, TenantUpdate
@@ -11,6 +11,7 @@ __all__ = [
     "AuditLogCreate",
     "AuditLogFilter",
     "AuditLogSearch",
+    "StreamedAuditLog",
     "LogSeverity",
     "LogAction",
     "User",
@@ -1,12 +1,15 @@
 """Audit log schemas."""
 
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Sequence
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, model_validator
 
 from .enums import LogAction, LogSeverity
 
+# Largest page of logs a client can request, larger sets of logs are exported
+MAX_PAGE_SIZE = 1000
+
 
 class AuditLogBase(BaseModel):
     """Base audit log schema."""
@@ -20,7 +23,9 @@ class AuditLogBase(BaseModel):
     before_state: Optional[Dict[str, Any]] = None
     after_state: Optional[Dict[str, Any]] = None
     log_metadata: Optional[Dict[str, Any]] = None
-    severity: LogSeverity = "info"
+    severity: LogSeverity = LogSeverity.INFO
+
+    model_config = ConfigDict(defer_build=True)
 
 
 class AuditLogCreate(AuditLogBase):
@@ -37,13 +42,50 @@ class AuditLog(AuditLogBase):
     created_at: datetime
     updated_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, defer_build=True)
 
     @classmethod
     def from_model(cls, model):
         """Convert SQLAlchemy model to a Pydantic model."""
         return cls.model_validate(model)
 
+    @classmethod
+    def from_models(cls, models: Sequence[Any]) -> List["AuditLog"]:
+        """
+        Convert SQLAlchemy models to Pydantic models, validating the whole list in a single call.
+
+        Args:
+            models: SQLAlchemy audit log models
+
+        Returns:
+            List of Pydantic audit logs
+        """
+        return AUDIT_LOG_LIST_ADAPTER.validate_python(models, from_attributes=True)
+
+
+# Built once, its validator is reused for every list of logs
+AUDIT_LOG_LIST_ADAPTER = TypeAdapter(List[AuditLog])
+
+
+class StreamedAuditLog(BaseModel):
+    """Schema for audit logs sent to the stream clients."""
+
+    id: int
+    tenant_id: int
+    user_id: str
+    action: LogAction
+    resource_type: str
+    resource_id: str
+    message: str
+    before_state: Optional[Dict[str, Any]] = None
+    after_state: Optional[Dict[str, Any]] = None
+    log_metadata: Optional[Dict[str, Any]] = None
+    severity: LogSeverity
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
 
 class AuditLogFilter(BaseModel):
     """Schema for filtering audit logs."""
@@ -54,8 +96,20 @@ class AuditLogFilter(BaseModel):
     severity: Optional[LogSeverity] = None
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
-    page: int = 1
-    limit: int = 100
+    page: int = Field(1, ge=1)
+    limit: int = Field(100, ge=1, le=MAX_PAGE_SIZE)
+    # Cursor of the last log of the previous page, replaces the page for deep pagination
+    after_created_at: Optional[datetime] = None
+    after_id: Optional[int] = None
+
+    model_config = ConfigDict(defer_build=True)
+
+    @model_validator(mode="after")
+    def check_cursor(self):
+        """Reject half a cursor instead of silently falling back to the first page."""
+        if (self.after_created_at is None) != (self.after_id is None):
+            raise ValueError("after_created_at and after_id must be provided together")
+        return self
 
     @classmethod
     def from_model(cls, model):
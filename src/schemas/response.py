@@ -2,7 +2,7 @@
 from datetime import datetime, timezone
 from typing import Generic, List, Optional, TypeVar
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 # Define a generic type for the data payload
 T = TypeVar("T")
@@ -14,6 +14,15 @@ class Pagination(BaseModel):
     page_size: int = Field(..., description="Number of items per page.")
     total_pages: int = Field(..., description="Total number of pages.")
 
+    model_config = ConfigDict(defer_build=True)
+
+
+class Cursor(BaseModel):
+    after_created_at: datetime = Field(..., description="Creation time of the last item of the page.")
+    after_id: int = Field(..., description="ID of the last item of the page.")
+
+    model_config = ConfigDict(defer_build=True)
+
 
 class BaseResponse(BaseModel):
     """Base response model for common fields."""
@@ -21,6 +30,9 @@ class BaseResponse(BaseModel):
     status: str = Field(..., description="Status of the response (e.g., 'success', 'error').")
     message: Optional[str] = Field(None, description="A human-readable message about the response.")
 
+    # The core schema of the responses is built on their first use instead of at import
+    model_config = ConfigDict(defer_build=True)
+
 
 class DataResponse(BaseResponse, Generic[T]):
     """Universal success response template."""
@@ -28,6 +40,7 @@ class DataResponse(BaseResponse, Generic[T]):
     status: str = "success"
     data: T = Field(None, description="The main data payload of the response.")
     pagination: Optional[Pagination] = Field(None, description="Pagination metadata for list responses.")
+    next_cursor: Optional[Cursor] = Field(None, description="Cursor of the next page for keyset paginated lists.")
 
 
 class MessageResponse(BaseResponse):
@@ -42,6 +55,8 @@ class ErrorDetail(BaseModel):
     message: str = Field(..., description="A detailed message about the error.")
     code: Optional[str] = Field(None, description="An application-specific error code.")
 
+    model_config = ConfigDict(defer_build=True)
+
 
 class ErrorResponse(BaseResponse):
     status: str = "error"
@@ -3,7 +3,7 @@
 from datetime import datetime
 from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from .enums import LogAction, LogSeverity
 
@@ -18,6 +18,8 @@ class SearchFilter(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
 
+    model_config = ConfigDict(defer_build=True)
+
 
 class AuditLogSearch(BaseModel):
     """Schema for audit log search parameters."""
@@ -27,11 +29,10 @@ class AuditLogSearch(BaseModel):
     sort_by: Optional[str] = Field("created_at", description="Field to sort results by")
     sort_direction: Optional[str] = Field("desc", description="Sort direction (asc or desc)")
 
-    class Config:
-        """Pydantic config."""
-
-        from_attributes = True
-        json_schema_extra = {
+    model_config = ConfigDict(
+        from_attributes=True,
+        defer_build=True,
+        json_schema_extra={
             "example": {
                 "query": "error login failed",
                 "filters": {
@@ -42,4 +43,5 @@ class AuditLogSearch(BaseModel):
                 "sort_by": "created_at",
                 "sort_direction": "desc",
             }
-        }
+        },
+    )
@@ -10,7 +10,7 @@ class TenantBase(BaseModel):
     name: str
     description: Optional[str] = None
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, defer_build=True)
 
 
 class TenantCreate(TenantBase):
@@ -33,7 +33,7 @@ class Tenant(TenantBase):
     created_at: datetime
     updated_at: datetime
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, defer_build=True)
 
     @classmethod
     def from_model(cls, model):
@@ -1,23 +1,37 @@
 from datetime import datetime
-from typing import Optional, Sequence
+from typing import AsyncIterator, Optional, Sequence
 
-from sqlalchemy import Row, func, select
+from sqlalchemy import Row, Select, bindparam, func, insert, select, text, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.models import AuditLog
 from src.schemas import AuditLogCreate, LogAction, LogSeverity
 
+STREAM_BATCH_SIZE = 1000
+
+# since timescale DB using tenant id as a dimension, we also use tenant_id to make use of partitioning
+GET_LOG_BY_ID_STMT = select(AuditLog).where(
+    AuditLog.id == bindparam("log_id"), AuditLog.tenant_id == bindparam("tenant_id")
+)
+
+# Counts are read from the daily continuous aggregate, the buckets that aren't materialized yet are counted in real time
+LOG_COUNT_STMT = text("SELECT coalesce(sum(log_count), 0)::bigint FROM audit_logs_count_daily")
+TENANT_LOG_COUNT_STMT = text(
+    "SELECT coalesce(sum(log_count), 0)::bigint FROM audit_logs_count_daily WHERE tenant_id = :tenant_id"
+)
+
 
 class LogService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     async def create_log(self, log_data: dict) -> AuditLog:
-        """Create a new audit log."""
-        log = AuditLog(**log_data)
-        self.db.add(log)
+        """Create a new audit log.
+
+        The row is inserted with RETURNING, its generated columns are loaded without a refresh query.
+        """
+        log = await self.db.scalar(insert(AuditLog).values(**log_data).returning(AuditLog))
         await self.db.commit()
-        await self.db.refresh(log)
         return log
 
     async def get_logs(
@@ -31,8 +45,13 @@ class LogService:
         end_date: Optional[datetime] = None,
         page: int = 1,
         limit: int = 100,
+        after_created_at: Optional[datetime] = None,
+        after_id: Optional[int] = None,
     ) -> Sequence[AuditLog]:
-        """Get audit logs with filtering options.
+        """Get audit logs with filtering options, the most recent first.
+
+        Given the cursor of the last log of the previous page, the page starts right after it in the index instead of
+        skipping the logs of the previous pages with an offset.
 
         Args:
             tenant_id: Tenant ID to filter logs by
@@ -42,13 +61,83 @@ class LogService:
             severity: Optional log severity to filter by (must be one of: INFO, WARNING, ERROR, CRITICAL)
             start_date: Optional start date to filter logs by
             end_date: Optional end date to filter logs by
-            page: Page number for pagination
+            page: Page number for pagination, ignored with a cursor
             limit: Number of items per page
+            after_created_at: Creation time of the last log of the previous page
+            after_id: ID of the last log of the previous page
 
         Returns:
             List of audit logs matching the filters
         """
 
+        stmt = self._filter_logs(tenant_id, user_id, resource_type, action, severity, start_date, end_date)
+        if after_created_at is not None and after_id is not None:
+            # The bound on created_at alone is the one the (tenant_id, created_at) index can seek to
+            stmt = stmt.where(
+                AuditLog.created_at <= after_created_at,
+                tuple_(AuditLog.created_at, AuditLog.id) < tuple_(after_created_at, after_id),
+            )
+        else:
+            stmt = stmt.offset((page - 1) * limit)
+        stmt = stmt.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(limit)
+
+        result = await self.db.execute(stmt)
+        return result.scalars().all()
+
+    async def count_logs(
+        self,
+        tenant_id: int,
+        user_id: Optional[str] = None,
+        resource_type: Optional[str] = None,
+        action: Optional[LogAction] = None,
+        severity: Optional[LogSeverity] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> int:
+        """Count the audit logs matching the filters, see `get_logs` for the arguments.
+
+        With a `limit`, the database stops counting after `limit` rows, which is enough to check an upper bound.
+        """
+        stmt = self._filter_logs(tenant_id, user_id, resource_type, action, severity, start_date, end_date)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return await self.db.scalar(select(func.count()).select_from(stmt.subquery()))
+
+    async def stream_logs(
+        self,
+        tenant_id: int,
+        user_id: Optional[str] = None,
+        resource_type: Optional[str] = None,
+        action: Optional[LogAction] = None,
+        severity: Optional[LogSeverity] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[AuditLog]:
+        """Stream the audit logs matching the filters, up to `limit` if set, see `get_logs` for the arguments.
+
+        Rows are fetched through a server-side cursor in batches of `STREAM_BATCH_SIZE`, so only one batch is held
+        in memory at a time.
+        """
+        stmt = self._filter_logs(tenant_id, user_id, resource_type, action, severity, start_date, end_date)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        result = await self.db.stream_scalars(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for log in result:
+            yield log
+
+    @staticmethod
+    def _filter_logs(
+        tenant_id: int,
+        user_id: Optional[str] = None,
+        resource_type: Optional[str] = None,
+        action: Optional[LogAction] = None,
+        severity: Optional[LogSeverity] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Select:
+        """Build the select statement of the audit logs matching the filters."""
         # using partitioning keys first
         stmt = select(AuditLog).where(AuditLog.tenant_id == tenant_id)
         if start_date:
@@ -64,11 +153,7 @@ class LogService:
             stmt = stmt.where(AuditLog.action == action)
         if severity:
             stmt = stmt.where(AuditLog.severity == severity)
-        offset = (page - 1) * limit
-        stmt = stmt.offset(offset).limit(limit)
-
-        result = await self.db.execute(stmt)
-        return result.scalars().all()
+        return stmt
 
     async def get_log_by_id(self, log_id: int, tenant_id: int) -> Optional[AuditLog]:
         """Get a specific audit log entry by ID and tenant.
@@ -81,15 +166,20 @@ class LogService:
             The audit log entry if found, None otherwise
         """
 
-        # since timescale DB using tenant id as a dimension, we also use tenant_id to make use of partitioning
-        stmt = select(AuditLog).where(AuditLog.id == log_id, AuditLog.tenant_id == tenant_id)
-
-        result = await self.db.execute(stmt)
+        # The statement is built once at import, only the parameters change per call
+        result = await self.db.execute(GET_LOG_BY_ID_STMT, {"log_id": log_id, "tenant_id": tenant_id})
         return result.scalar_one_or_none()
 
-    async def get_log_count(self, tenant_id: int | None = None) -> Optional[int]:
-        query = select(func.count(AuditLog.id))
+    async def get_log_count(self, tenant_id: int | None = None) -> int:
+        """
+        Count the logs from the daily continuous aggregate, summing one row per day and tenant.
+
+        Args:
+            tenant_id: Tenant to count the logs of, all tenants if not given
+
+        Returns:
+            Number of logs
+        """
         if tenant_id:
-            query = query.where(AuditLog.tenant_id == tenant_id)
-        total_logs = await self.db.scalar(query)
-        return total_logs
+            return await self.db.scalar(TENANT_LOG_COUNT_STMT, {"tenant_id": tenant_id})
+        return await self.db.scalar(LOG_COUNT_STMT)
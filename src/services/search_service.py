@@ -1,16 +1,35 @@
 """Service layer for audit log search functionality."""
-import json
+import asyncio
 import logging
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Optional
 
 import opensearchpy
+import orjson
 
 from src.core.config import get_settings
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# Date bounds are rounded to this precision, so that repeated searches share the filter cache of OpenSearch
+DATE_ROUNDING = timedelta(minutes=1)
+# Filters mapped to a bound of the range on the creation time of the logs
+DATE_RANGE_FILTERS = {"start_date": "gte", "end_date": "lte"}
+
+
+class OrjsonSerializer(opensearchpy.JSONSerializer):
+    """OpenSearch serializer encoding request bodies and decoding responses with orjson."""
+
+    def dumps(self, data: Any) -> str:
+        if isinstance(data, str):
+            return data
+        return orjson.dumps(data, default=self.default).decode()
+
+    def loads(self, s: str) -> Any:
+        return orjson.loads(s)
+
 
 class SearchService:
     """Service class for handling audit log search operations.
@@ -25,9 +44,18 @@ class SearchService:
         """
         Initialize the SearchService.
 
-        Creates a connection to OpenSearch using the configured URL.
+        Creates a connection to OpenSearch using the configured URL, with gzip compressed requests
+        and a connection pool shared by concurrent requests.
         """
-        self.opensearch = opensearchpy.OpenSearch(hosts=[settings.OPENSEARCH_URL], timeout=30)
+        self.opensearch = opensearchpy.OpenSearch(
+            hosts=[settings.OPENSEARCH_URL],
+            timeout=30,
+            http_compress=True,
+            pool_maxsize=25,
+            retry_on_timeout=True,
+            max_retries=3,
+            serializer=OrjsonSerializer(),
+        )
 
     async def search_logs(
         self,
@@ -36,7 +64,7 @@ class SearchService:
         filters: Optional[Dict[str, Any]] = None,
         page: int = 1,
         limit: int = 100,
-    ) -> List[Dict[str, Any]]:
+    ) -> Dict[str, Any]:
         """
         Search audit logs using OpenSearch with full-text search.
 
@@ -48,21 +76,24 @@ class SearchService:
             limit (int): Number of results per page
 
         Returns:
-            List[Dict[str, Any]]: List of search results
+            Dict[str, Any]: Total number of matching logs and the search results of the page
 
         Raises:
             Exception: If search fails
         """
+        # Exact matches are filters, OpenSearch caches them and doesn't score them
         body = {
             "query": {
                 "bool": {
-                    "must": [
+                    "must": [],
+                    "filter": [
                         {"term": {"tenant_id": str(tenant_id)}},
-                    ]
+                    ],
                 }
             },
             "size": limit,
             "from": (page - 1) * limit,
+            "track_total_hits": True,
         }
 
         # Add a full-text search query if provided
@@ -80,18 +111,94 @@ class SearchService:
 
         # Add additional filters
         if filters:
+            date_bounds = {}
             for field, value in filters.items():
-                if isinstance(value, datetime):
-                    body["query"]["bool"]["must"].append({"range": {field: {"gte": value.isoformat()}}})
+                if value is None:
+                    continue
+                if field in DATE_RANGE_FILTERS:
+                    date_bounds[DATE_RANGE_FILTERS[field]] = value
                 else:
-                    body["query"]["bool"]["must"].append({"term": {field: value}})
+                    body["query"]["bool"]["filter"].append({"term": {field: value}})
+            if date_bounds:
+                body["query"]["bool"]["filter"].append(
+                    date_range_filter("created_at", date_bounds.get("gte"), date_bounds.get("lte"))
+                )
 
         try:
-            response = self.opensearch.search(index=self.INDEX_NAME, body=body)
-            return [hit["_source"] for hit in response["hits"]["hits"]]
+            # The client is synchronous, run the request in a thread so that it doesn't block the event loop
+            response = await asyncio.to_thread(self.opensearch.search, index=self.INDEX_NAME, body=body)
+            hits = response["hits"]
+            return {"total": hits["total"]["value"], "results": [hit["_source"] for hit in hits["hits"]]}
         except opensearchpy.NotFoundError as e:
             logger.debug(f"No index yet")
-            return []
+            return {"total": 0, "results": []}
         except Exception as e:
             logger.error(f"Search failed: {str(e)}")
             raise
+
+
+def round_down(value: datetime) -> datetime:
+    """Round a datetime down to `DATE_ROUNDING`."""
+    return value - (value - datetime.min.replace(tzinfo=value.tzinfo)) % DATE_ROUNDING
+
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert a datetime to an aware UTC datetime, a naive datetime being in UTC."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def date_range_filter(field: str, start: Optional[datetime], end: Optional[datetime]) -> Dict[str, Any]:
+    """
+    Build the filter of a date range, its bounds being both inclusive.
+
+    The bulk of the range has bounds rounded to `DATE_ROUNDING`, which OpenSearch can cache across searches. The few
+    moments between an exact bound and its rounded one are matched by clauses of their own, so that the filter
+    matches the exact range.
+
+    Args:
+        field: Date field to filter on
+        start: Lower bound of the range
+        end: Upper bound of the range
+
+    Returns:
+        Dict[str, Any]: OpenSearch filter clause
+    """
+    # Naive bounds are UTC, as OpenSearch reads dates without offset, so that naive and aware bounds can be compared
+    start, end = to_utc(start), to_utc(end)
+    rounded_start = rounded_end = None
+    if start is not None:
+        rounded_start = round_down(start)
+        if rounded_start != start:
+            rounded_start += DATE_ROUNDING
+    if end is not None:
+        rounded_end = round_down(end)
+    if rounded_start is not None and rounded_end is not None and rounded_start >= rounded_end:
+        # The range is too short to have a rounded part
+        return {"range": {field: {"gte": start.isoformat(), "lte": end.isoformat()}}}
+
+    middle, clauses = {}, []
+    if start is not None:
+        middle["gte"] = rounded_start.isoformat()
+        if rounded_start != start:
+            clauses.append({"range": {field: {"gte": start.isoformat(), "lt": rounded_start.isoformat()}}})
+    if end is not None:
+        if rounded_end == end:
+            middle["lte"] = end.isoformat()
+        else:
+            middle["lt"] = rounded_end.isoformat()
+            clauses.append({"range": {field: {"gte": rounded_end.isoformat(), "lte": end.isoformat()}}})
+    clauses.append({"range": {field: middle}})
+
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"bool": {"should": clauses, "minimum_should_match": 1}}
+
+
+@lru_cache
+def get_search_service() -> SearchService:
+    """Get the shared SearchService instance, reusing its OpenSearch connection pool across requests."""
+    return SearchService()
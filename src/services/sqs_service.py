@@ -1,63 +1,137 @@
 """Service layer for SQS-based background tasks."""
 
-import json
+import asyncio
 import logging
 from datetime import datetime, timezone
-from typing import Any, Dict
+from functools import lru_cache
+from typing import Any, Coroutine, Dict, List, Optional, Set
 
 import boto3
+import orjson
 
 from src.core import config
 from src.enums.task_type import TaskType
-from src.services.search_service import SearchService
 
 settings = config.get_settings()
 logger = logging.getLogger(__name__)
 
+# SendMessageBatch limits
+SQS_BATCH_MAX_MESSAGES = 10
+SQS_BATCH_MAX_BYTES = 256 * 1024
+
 
 class SQSService:
-    """Service class for handling SQS-based background tasks."""
+    """Service class for handling SQS-based background tasks.
+
+    Tasks are buffered and sent with `SendMessageBatch`, once a batch is full or `SQS_BATCH_INTERVAL` has elapsed.
+    """
 
     def __init__(self):
         self.client = boto3.client("sqs", **settings.sqs_config)
         response = self.client.get_queue_url(QueueName=settings.SQS_QUEUE_NAME)
         self.queue_url = response["QueueUrl"]
-        self.search_service = SearchService()
+        self._batch: List[Dict[str, Any]] = []
+        self._batch_size = 0
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Strong references to the flush tasks until they are done
+        self._flush_tasks: Set[asyncio.Task] = set()
 
-    async def send_task(self, task_type: TaskType, payload: Dict[str, Any]) -> str:
+    async def send_task(self, task_type: TaskType, payload: Dict[str, Any]) -> None:
         """
-        Send a background task to SQS asynchronously.
+        Queue a background task to be sent to SQS with the next batch, without waiting for SQS.
 
         Args:
             task_type (TaskType): Type of task
             payload (Dict[str, Any]): Task payload
 
-        Returns:
-            str: Message ID
-
         Raises:
             ValueError: If an invalid task type is provided
-            Exception: If message sending fails
         """
         message = {
             "task_type": task_type,
             "payload": payload,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "retries": 0,
+            "created_at": datetime.now(timezone.utc),
         }
 
         if not isinstance(task_type, TaskType):
             raise ValueError(f"Invalid task type: {task_type}")
 
+        body = orjson.dumps(message)
+        task_type_value = task_type.value
+        entry = {
+            "MessageBody": body.decode(),
+            "MessageAttributes": {"task_type": {"DataType": "String", "StringValue": task_type_value}},
+        }
+        size = len(body) + len("task_type") + len("String") + len(task_type_value)
+        # Full batches are sent in the background as well, the caller never waits for SQS
+        async with self._lock:
+            if self._batch_size + size > SQS_BATCH_MAX_BYTES:
+                self._start_flush_task(self._send_batch(self._take_batch()))
+            entry["Id"] = str(len(self._batch))
+            self._batch.append(entry)
+            self._batch_size += size
+            if len(self._batch) >= SQS_BATCH_MAX_MESSAGES:
+                self._start_flush_task(self._send_batch(self._take_batch()))
+            elif self._flush_task is None:
+                self._flush_task = self._start_flush_task(self._flush_after(settings.SQS_BATCH_INTERVAL))
+
+    async def flush(self) -> None:
+        """Send the buffered tasks immediately."""
+        async with self._lock:
+            batch = self._take_batch()
+        await self._send_batch(batch)
+
+    async def close(self) -> None:
+        """Send the buffered tasks and wait for the batches being sent, so that no task is lost on shutdown."""
+        await self.flush()
+        await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+
+    async def _flush_after(self, delay: float) -> None:
+        """Send the buffered tasks once `delay` seconds have elapsed."""
+        await asyncio.sleep(delay)
+        async with self._lock:
+            self._flush_task = None
+            batch = self._take_batch()
+        await self._send_batch(batch)
+
+    def _start_flush_task(self, coro: Coroutine[Any, Any, None]) -> asyncio.Task:
+        """Run a flush in the background, keeping a reference to its task until it is done."""
+        task = asyncio.create_task(coro)
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+        return task
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        """Empty the buffer, must be called holding the lock."""
+        batch = self._batch
+        self._batch = []
+        self._batch_size = 0
+        return batch
+
+    async def _send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        Send a batch of buffered tasks to SQS.
+
+        Errors are logged, the tasks were already acknowledged to their callers.
+
+        Args:
+            batch (List[Dict[str, Any]]): SendMessageBatch entries
+        """
+        if not batch:
+            return
+
         try:
-            response = self.client.send_message(
-                QueueUrl=self.queue_url,
-                MessageBody=json.dumps(message),
-                MessageAttributes={"task_type": {"DataType": "String", "StringValue": str(task_type)}},
-            )
-            msg_id = response["MessageId"]
-            logger.info(f"Task {msg_id} sent to SQS: {task_type}")
-            return msg_id
+            # boto3 is blocking, run the call in a worker thread to keep the event loop free
+            response = await asyncio.to_thread(self.client.send_message_batch, QueueUrl=self.queue_url, Entries=batch)
+            for failed in response.get("Failed", []):
+                logger.error(f"Error sending SQS message {failed['Id']}: {failed.get('Message')}")
+            logger.info(f"{len(response.get('Successful', []))} tasks sent to SQS")
         except Exception as e:
-            logger.error(f"Error sending SQS message: {str(e)}")
-            raise
+            logger.error(f"Error sending SQS message batch: {str(e)}")
+
+
+@lru_cache
+def get_sqs_service() -> SQSService:
+    """Get the shared SQSService instance, whose buffer batches the tasks of concurrent requests."""
+    return SQSService()
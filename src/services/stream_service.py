@@ -1,19 +1,115 @@
 """Service layer for real-time log streaming."""
 
 import asyncio
-import json
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from typing import List, Sequence
+from typing import Dict, List, Optional, Sequence, Set
 
+import asyncpg
 from fastapi.websockets import WebSocket, WebSocketDisconnect
+from pydantic import TypeAdapter
 from sqlalchemy import Row, RowMapping, select
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core import config
 from src.models import AuditLog
+from src.schemas import StreamedAuditLog
 
 logger = logging.getLogger(__name__)
 
+settings = config.get_settings()
+
+# Channel notified with the tenant ID by the trigger on the audit logs
+NEW_LOG_CHANNEL = "audit_log_new"
+# created_at is the start time of the inserting transaction, so a log can commit after logs created later than it.
+# The logs created this long before the last log sent are fetched again, the ones already sent are skipped by ID.
+STREAM_OVERLAP = timedelta(minutes=1)
+
+# Encodes a whole batch of logs to JSON in pydantic-core, built once for every stream
+STREAMED_LOG_LIST_ADAPTER = TypeAdapter(List[StreamedAuditLog])
+
+
+class LogNotifier:
+    """
+    Wake the streams of a tenant when logs of the tenant are inserted.
+
+    All the streams of the process share a single connection listening to `NEW_LOG_CHANNEL`, opened on the first
+    subscription. When the connection is lost, the streams are woken to query the logs they may have missed and to
+    reconnect it.
+    """
+
+    def __init__(self):
+        self._connection: Optional[asyncpg.Connection] = None
+        self._events: Dict[int, Set[asyncio.Event]] = defaultdict(set)
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, tenant_id: int) -> asyncio.Event:
+        """
+        Subscribe to the new logs of a tenant.
+
+        Args:
+            tenant_id (int): ID of the tenant
+
+        Returns:
+            asyncio.Event: Event set when logs of the tenant are inserted
+        """
+        await self.listen()
+        event = asyncio.Event()
+        self._events[tenant_id].add(event)
+        return event
+
+    def unsubscribe(self, tenant_id: int, event: asyncio.Event) -> None:
+        """Remove an event returned by `subscribe`."""
+        events = self._events.get(tenant_id)
+        if events is not None:
+            events.discard(event)
+            if not events:
+                del self._events[tenant_id]
+
+    @property
+    def listening(self) -> bool:
+        """Whether the listening connection is open."""
+        return self._connection is not None and not self._connection.is_closed()
+
+    async def close(self) -> None:
+        """Close the listening connection."""
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    async def listen(self) -> None:
+        """Open the listening connection if it isn't open."""
+        async with self._lock:
+            if self.listening:
+                return
+            url = make_url(settings.DATABASE_URL)
+            self._connection = await asyncpg.connect(
+                user=url.username, password=url.password, host=url.host, port=url.port, database=url.database
+            )
+            self._connection.add_termination_listener(self._terminated)
+            await self._connection.add_listener(NEW_LOG_CHANNEL, self._notify)
+            logger.info(f"Listening to {NEW_LOG_CHANNEL} notifications")
+
+    def _notify(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        """Set the events of the tenant of a notification."""
+        for event in self._events.get(int(payload), ()):
+            event.set()
+
+    def _terminated(self, connection: asyncpg.Connection) -> None:
+        """Wake all the streams when the listening connection is lost, notifications may have been missed."""
+        logger.warning(f"Connection listening to {NEW_LOG_CHANNEL} notifications lost")
+        if self._connection is connection:
+            self._connection = None
+        for events in self._events.values():
+            for event in events:
+                event.set()
+
+
+# Global notifier, LISTEN needs a session of its own so it is not available through PgBouncer in transaction mode
+log_notifier = None if settings.USE_PGBOUNCER else LogNotifier()
+
 
 class StreamService:
     """Service class for handling real-time log streaming."""
@@ -26,58 +122,47 @@ class StreamService:
             db (AsyncSession): Async database session
         """
         self.db = db
-        self.last_check_time = datetime.now(timezone.utc)
+        self.started_at = datetime.now(timezone.utc)
+        self.last_check_time = self.started_at
+        # Creation time of the logs sent within the overlap, by ID
+        self.sent_logs: Dict[int, datetime] = {}
         self.check_interval = 10  # seconds
 
-    async def get_new_logs_mapping(self, tenant_id: int) -> list[dict]:
+    async def get_new_logs(self, tenant_id: int) -> Sequence[AuditLog]:
         """
-        Get new logs since last check.
+        Get the logs not sent yet, created after the stream started.
 
         Args:
             tenant_id (int): ID of the tenant
 
         Returns:
-            List[dict]: List of new audit logs as dictionaries
+            Sequence[AuditLog]: New audit logs
         """
         try:
-            now = datetime.now(timezone.utc)
-            time_window = now - timedelta(seconds=self.check_interval)
-
             # Get new logs
+            since = max(self.started_at, self.last_check_time - STREAM_OVERLAP)
             query = (
                 select(AuditLog)
-                .where(AuditLog.tenant_id == tenant_id, AuditLog.created_at >= time_window)
+                .where(AuditLog.tenant_id == tenant_id, AuditLog.created_at > since)
                 .order_by(AuditLog.created_at)
             )
 
             result = await self.db.execute(query)
-            logs = result.scalars().all()
-
-            # Convert SQLAlchemy objects to dictionaries and handle datetime serialization
-            logs_data = []
-            for log in logs:
-                log_dict = {
-                    "id": log.id,
-                    "tenant_id": log.tenant_id,
-                    "user_id": log.user_id,
-                    "action": log.action,
-                    "resource_type": log.resource_type,
-                    "resource_id": log.resource_id,
-                    "message": log.message,
-                    "before_state": log.before_state,
-                    "after_state": log.after_state,
-                    "log_metadata": log.log_metadata,
-                    "severity": log.severity,
-                    "created_at": log.created_at.isoformat() if log.created_at else None,
-                    "updated_at": log.updated_at.isoformat() if log.updated_at else None,
+            logs = [log for log in result.scalars().all() if log.id not in self.sent_logs]
+            # End the read transaction, the connection goes back to the pool while the stream waits, the sessions
+            # don't expire the loaded logs on commit
+            await self.db.commit()
+
+            if logs:
+                self.last_check_time = max(self.last_check_time, logs[-1].created_at)
+                self.sent_logs.update((log.id, log.created_at) for log in logs)
+                cutoff = self.last_check_time - STREAM_OVERLAP
+                self.sent_logs = {
+                    log_id: created_at for log_id, created_at in self.sent_logs.items() if created_at > cutoff
                 }
-                logs_data.append(log_dict)
-
-            # Update last check time
-            self.last_check_time = now
 
-            logger.info(f"Found {len(logs_data)} new logs for tenant {tenant_id}")
-            return logs_data
+            logger.info(f"Found {len(logs)} new logs for tenant {tenant_id}")
+            return logs
 
         except Exception as e:
             logger.error(f"Error getting new logs: {str(e)}")
@@ -91,25 +176,48 @@ class StreamService:
             tenant_id (int): ID of the tenant
             websocket (WebSocket): WebSocket connection
         """
+        new_logs_event = None
         try:
             await websocket.accept()
+            if log_notifier is not None:
+                new_logs_event = await log_notifier.subscribe(tenant_id)
 
             while True:
-                # Wait for new logs
-                new_logs_mapping = await self.get_new_logs_mapping(tenant_id)
-
-                if new_logs_mapping:
-                    # Send logs to the client (already serialized as a list of dicts)
-                    await websocket.send_text(json.dumps(new_logs_mapping))
+                # Wait for new logs, the database is only queried when the tenant has some
+                if new_logs_event is None:
+                    await asyncio.sleep(self.check_interval)
+                else:
+                    try:
+                        await asyncio.wait_for(new_logs_event.wait(), timeout=self.check_interval)
+                    except asyncio.TimeoutError:
+                        if log_notifier.listening:
+                            await websocket.send_text("Checking for new logs")
+                            continue
+                    new_logs_event.clear()
+                    if not log_notifier.listening:
+                        # Poll until the listening connection is back
+                        try:
+                            await log_notifier.listen()
+                        except Exception as e:
+                            logger.warning(f"Could not listen to new logs, polling instead: {e}")
+                new_logs = await self.get_new_logs(tenant_id)
+
+                if new_logs:
+                    # Send logs to the client, the batch is encoded from the models in a single call
+                    await websocket.send_text(
+                        STREAMED_LOG_LIST_ADAPTER.dump_json(
+                            STREAMED_LOG_LIST_ADAPTER.validate_python(new_logs, from_attributes=True)
+                        ).decode()
+                    )
                 else:
                     # Send a heartbeat message
                     await websocket.send_text("Checking for new logs")
 
-                # Wait for a short period before checking again
-                await asyncio.sleep(self.check_interval)
-
         except WebSocketDisconnect:
             logger.info(f"WebSocket disconnected for tenant {tenant_id}")
         except Exception as e:
             logger.error(f"Error in stream_logs: {str(e)}")
             raise
+        finally:
+            if new_logs_event is not None:
+                log_notifier.unsubscribe(tenant_id, new_logs_event)